@@ -1,6 +1,7 @@
 import numpy as np
 import torch
 from scipy import signal
+from scipy.ndimage import uniform_filter1d
 from numba import njit, prange
 from numba.errors import NumbaDeprecationWarning, NumbaPendingDeprecationWarning
 import warnings
@@ -120,6 +121,7 @@ def spk_time_to_scv(spk_time_dict, ts, t_window=250e-3, sublist=None):
         spk_time_list = list(spk_time_dict.values())
     else:
         spk_time_list = [spk_time_dict.get(key) for key in sublist]
+    spk_time_list = [np.sort(spk_time) for spk_time in spk_time_list]  # binary search needs sorted spike trains
     suv = scv_from_spk_time_list(spk_time_list, ts, t_window)
     return suv
 
@@ -127,18 +129,29 @@ def spk_time_to_scv(spk_time_dict, ts, t_window=250e-3, sublist=None):
 @njit(cache=True, parallel=True, fastmath=True)
 def scv_from_spk_time_list(spk_time_list, ts, t_window=250e-3):
     '''
-    extract spike count vector from a list of spike trains
+    extract spike count vector from a list of sorted spike trains
+    the count of neuron j at ts[i] is the number of spikes in [ts[i]-t_window, ts[i]), 
+    which is the difference of two binary searches of the whole `ts` in that spike train
     '''
     N = len(spk_time_list)
     T = ts.shape[0]
     suv = np.zeros((T, N))
-    for i in prange(T):
-        for j in prange(N):
-            suv[i, j] = np.sum(np.logical_and(spk_time_list[j] >= ts[i] - t_window,
-                                              spk_time_list[j] < ts[i]))
+    for j in prange(N):
+        suv[:, j] = np.searchsorted(spk_time_list[j], ts) - np.searchsorted(spk_time_list[j], ts - t_window)
     return suv[1:]
 
 
+def sliding_window_to_feature(scv, B_bins):
+    '''
+    stack `B_bins` consecutive rows of the spike count vector (T, N) into a (T-B_bins+1, B_bins, N) feature
+    it is a read-only zero-copy view of `scv` (no (T, B_bins, N) allocation), copy it if it need to be modified
+    '''
+    T, N = scv.shape
+    return np.lib.stride_tricks.as_strided(scv, shape=(T-B_bins+1, B_bins, N), 
+                                           strides=(scv.strides[0], scv.strides[0], scv.strides[1]),
+                                           writeable=False)
+
+
 @njit(cache=True)
 def licomb_Matrix(w, X):
     '''
@@ -212,16 +225,10 @@ def argmax_2d_tensor(X):
 
 def smooth(x, window_len=60):
     '''
-    moving weighted average
+    moving average along axis 0 (running-sum box filter, zero padded at both ends)
+    same result as np.convolve(x[:,i], np.ones(window_len)/window_len, mode='same') for each column
     '''
-    tau = 0.0005
-    y = np.empty_like(x)
-    # box = np.exp(tau*np.arange(window_len))
-    box = np.ones((window_len,))
-    box = box/float(box.sum())
-    for i in range(y.shape[1]):
-        y[:,i] = np.convolve(x[:,i], box, mode='same')
-    return y
+    return uniform_filter1d(x, size=window_len, axis=0, mode='constant', cval=0.0)
 
 
 def gkern2d(kernlen=21, std=2):
@@ -257,7 +257,7 @@ class NaiveBayes(Decoder):
         if first_unit_is_noise:
             self.pc.spk_time_dict = {i: self.pc.spk_time_dict[i+1] for i in range(len(self.pc.spk_time_dict.keys())-1)}
         self.pc.get_fields(self.pc.spk_time_dict, self.train_time[0], self.train_time[1], v_cutoff=self.v_cutoff, rank=False)
-        self.fields = self.pc.fields
+        self.fields = self.pc.fields.astype(np.float64) # pc.fields is float32, the log posterior needs float64 to not underflow
         self.spatial_bin_size, self.spatial_origin = self.pc.bin_size, self.pc.maze_original
 
         # for real-time decoding on incoming bin from BMI   
@@ -6,12 +6,15 @@ import matplotlib as mpl
 import seaborn as sns
 from matplotlib.pyplot import cm
 from scipy.interpolate import interp1d
-from .core import spk_time_to_scv, firing_pos_from_scv, smooth
+from .core import spk_time_to_scv, sliding_window_to_feature, firing_pos_from_scv, smooth
 from ..base import SPKTAG
 from ..utils import colorbar
 from ..utils.plotting import colorline
 
 
+# place fields and occupation are visualization/analysis grade, float32 halves their footprint
+_FIELD_DTYPE = np.float32
+
 
 def info_bits(Fr, P):
     Fr[Fr==0] = 1e-25
@@ -25,6 +28,25 @@ def info_sparcity(Fr, P):
     return sum(P.ravel()*Fr.ravel()**2/MFr**2)
 
 
+def compute_field(spk_times, ts, pos, low_speed_idx, O, dt, nbins, maze_range, kernel):
+    '''
+    pure version of `place_field._get_field`, `kernel` is the smoothing kernel (`place_field.kernel`)
+    return (firing_map, FR, FR_smoothed, firing_pos) of a single spike train
+    '''
+    spk_ts = np.searchsorted(ts, spk_times) - 1
+    idx = np.setdiff1d(spk_ts, low_speed_idx)
+    firing_pos = pos[idx]
+    firing_map, x_edges, y_edges = np.histogram2d(x=firing_pos[:,0], y=firing_pos[:,1], 
+                                                  bins=nbins, range=maze_range)
+    firing_map = firing_map.T.astype(_FIELD_DTYPE)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        FR = firing_map/(O*_FIELD_DTYPE(dt))
+    FR[np.isnan(FR)] = 0
+    FR[np.isinf(FR)] = 0
+    FR_smoothed = signal.convolve2d(FR, kernel, boundary='symm', mode='same')
+    return firing_map, FR, FR_smoothed, firing_pos
+
+
 class place_field(object):
     '''
     place cells class contains `ts` `pos` `scv` for analysis
@@ -218,7 +240,7 @@ class place_field(object):
         occupation, self.x_edges, self.y_edges = np.histogram2d(x=self.pos[idx,0], y=self.pos[idx,1], 
                                                                 bins=self.nbins, range=self.maze_range)
         self.X, self.Y = np.meshgrid(self.x_edges, self.y_edges)
-        self.O = occupation.T.astype(int)  # Let each row list bins with common y range.
+        self.O = occupation.T.astype(_FIELD_DTYPE)  # Let each row list bins with common y range.
         self.P = self.O/float(self.O.sum()) # occupation prabability
 
         #### parameter used to calculate the fields
@@ -247,21 +269,40 @@ class place_field(object):
         gkern2d /= gkern2d.sum()
         return gkern2d
 
+    @property
+    def kernlen(self):
+        return self._kernlen
+
+    @kernlen.setter
+    def kernlen(self, kernlen):
+        self._kernlen = kernlen
+        self._kernel = None
+
+    @property
+    def kernstd(self):
+        return self._kernstd
+
+    @kernstd.setter
+    def kernstd(self, kernstd):
+        self._kernstd = kernstd
+        self._kernel = None
+
+    @property
+    def kernel(self):
+        '''
+        the smoothing kernel in _FIELD_DTYPE, built once after `kernlen` or `kernstd` is set
+        '''
+        if self._kernel is None:
+            self._kernel = self.gkern(self.kernlen, self.kernstd).astype(_FIELD_DTYPE)
+        return self._kernel
+
 
     def _get_field(self, spk_times):
         spk_ts = np.searchsorted(self.ts, spk_times) - 1
-        idx = np.setdiff1d(spk_ts, self.low_speed_idx)
         self.firing_ts  = self.ts[spk_ts] #[:,1]
-        self.firing_pos = self.pos[idx]        
-        self.firing_map, x_edges, y_edges = np.histogram2d(x=self.firing_pos[:,0], y=self.firing_pos[:,1], 
-                                                           bins=self.nbins, range=self.maze_range)
-        self.firing_map = self.firing_map.T
-        np.seterr(divide='ignore', invalid='ignore')
-        self.FR = self.firing_map/(self.O*self.dt)
-        # self.FR = np.nan_to_num(self.FR)
-        self.FR[np.isnan(self.FR)] = 0
-        self.FR[np.isinf(self.FR)] = 0
-        self.FR_smoothed = signal.convolve2d(self.FR, self.gkern(self.kernlen, self.kernstd), boundary='symm', mode='same')
+        self.firing_map, self.FR, self.FR_smoothed, self.firing_pos = compute_field(spk_times, self.ts, self.pos,
+                                                                                  self.low_speed_idx, self.O, self.dt,
+                                                                                  self.nbins, self.maze_range, self.kernel)
         return self.FR_smoothed
 
 
@@ -273,15 +314,16 @@ class place_field(object):
         scv = scv.T.copy()
         n_neurons, total_bin = scv.shape
         valid_bin = np.array(np.array(section)*total_bin, dtype=np.int)
-        firing_map_smoothed = np.zeros((n_neurons, *self.map_binned_size))
+        firing_map_smoothed = np.zeros((n_neurons, *self.map_binned_size), dtype=_FIELD_DTYPE)
         for neuron_id in range(n_neurons):
             firing_pos = firing_pos_from_scv(scv, self.pos, neuron_id, valid_bin)
             firing_map, x_edges, y_edges = np.histogram2d(x=firing_pos[:,0], y=firing_pos[:,1], 
                                                           bins=self.nbins, range=self.maze_range)
-            firing_map = firing_map.T/self.O/t_step
+            with np.errstate(divide='ignore', invalid='ignore'):
+                firing_map = firing_map.T.astype(_FIELD_DTYPE)/self.O/_FIELD_DTYPE(t_step)
             firing_map[np.isnan(firing_map)] = 0
             firing_map[np.isinf(firing_map)] = 0
-            firing_map_smoothed[neuron_id] = signal.convolve2d(firing_map, self.gkern(self.kernlen, self.kernstd), boundary='symm', mode='same')
+            firing_map_smoothed[neuron_id] = signal.convolve2d(firing_map, self.kernel, boundary='symm', mode='same')
             firing_map_smoothed[firing_map_smoothed==0] = 1e-25
 
         self.fields = firing_map_smoothed
@@ -335,7 +377,7 @@ class place_field(object):
 
         self.n_fields = len(spk_time_dict.keys())
         self.n_units  = self.n_fields
-        self.fields = np.zeros((self.n_fields, self.O.shape[0], self.O.shape[1]))
+        self.fields = np.zeros((self.n_fields, self.O.shape[0], self.O.shape[1]), dtype=_FIELD_DTYPE)
         self.firing_pos_dict = {}
 
         if v_cutoff is None:
@@ -351,7 +393,6 @@ class place_field(object):
             self.get_field(spk_time_dict, i, start, end)
             self.fields[i] = self.FR_smoothed
             self.firing_pos_dict[i] = self.firing_pos
-            self.fields[i] = self.FR_smoothed
             ### metrics for place fields
 
         self.fields[self.fields==0] = 1e-25
@@ -488,8 +529,14 @@ class place_field(object):
         self.spike_df.index -= self.spike_df.index.min()
         self.spike_df.index.name = 'spike_id'
         self.df['spk'] = self.spike_df
-        self.spk_time_dict = {i: self.spike_df.loc[i]['frame_id'].to_numpy() 
-                              for i in self.spike_df.index.unique().sort_values()}
+        # sort spikes by unit once, each unit's spike times is then a view into the sorted array
+        spike_id = self.spike_df.index.to_numpy()
+        order = np.argsort(spike_id, kind='stable')
+        spike_id, spike_time = spike_id[order], self.spike_df['frame_id'].to_numpy()[order]
+        unit_ids = np.unique(spike_id)
+        starts = np.searchsorted(spike_id, unit_ids, side='left')
+        ends   = np.searchsorted(spike_id, unit_ids, side='right')
+        self.spk_time_dict = {i: spike_time[start:end] for i, start, end in zip(unit_ids, starts, ends)}
         self.df['spk'].reset_index(inplace=True)
         self.n_units = np.sort(self.spike_df.spike_id.unique()).shape[0]
         self.n_groups = np.sort(self.spike_df.group_id.unique()).shape[0]
@@ -547,17 +594,20 @@ class place_field(object):
             self.field_fig = self.plot_fields();
 
 
-    def get_scv(self, t_window):
+    def get_scv(self, t_window, B_bins=None):
         '''
         The offline binner to calculate the spike count vector (scv)
         run `pc.load_spktag(spktag_file)` first
         t_window is the window to count spikes
         t_step defines the sliding window size
+        B_bins (optional) stacks B_bins consecutive scv into a (T-B_bins+1, B_bins, N) zero-copy view for RNN decoder
         '''
         # if t_step is None:
         self.scv = spk_time_to_scv(self.spk_time_dict, t_window=t_window, ts=self.ts)
         self.mua_count = self.scv.sum(axis=1)
         # scv = scv[self.sorted_fields_id]
+        if B_bins is not None:
+            return sliding_window_to_feature(self.scv, B_bins)
         return self.scv
         # else:
         #     new_ts = np.arange(self.t_start, self.t_end, t_step)
@@ -568,6 +618,31 @@ class place_field(object):
         #     return scv, new_ts, new_pos
 
 
+    def get_trial_time(self, goal_pos, goal_radius, v_cutoff=None):
+        '''
+        segment the trajectory into trials, each trial ends when the animal arrives at `goal_radius` around `goal_pos`
+        (it was outside the goal the sample before) and starts at the last time the smoothed speed crossed `v_cutoff`
+        before that arrival, so a false start that slows down again before the goal does not start a trial
+        a crossing is used by one arrival only, so trials never overlap and every trial has end > start
+        return a (n_trials, 2) array of [start_time, end_time], arrivals without a crossing before them are dropped
+        '''
+        if v_cutoff is None:
+            v_cutoff = self.v_cutoff
+        above_thres = self.v_smoothed > v_cutoff
+        entering = np.flatnonzero(np.diff(above_thres.astype(int)) == 1) + 1
+        at_goal = np.linalg.norm(self.pos - np.asarray(goal_pos), axis=1) < goal_radius
+        arriving = np.flatnonzero(np.diff(at_goal.astype(int)) == 1) + 1
+        # last crossing strictly before each arrival
+        start_idx = np.searchsorted(entering, arriving) - 1
+        valid = start_idx >= 0
+        arriving, start_idx = arriving[valid], start_idx[valid]
+        # arriving is sorted so start_idx is too, a crossing only starts the trial of the first arrival after it
+        _, first = np.unique(start_idx, return_index=True)
+        arriving, start_idx = arriving[first], start_idx[first]
+        self.trial_time = np.stack([self.ts[entering[start_idx]], self.ts[arriving]], axis=1)
+        return self.trial_time
+
+
     def plot_epoch(self, time_range, figsize=(5,5), marker=['ro', 'wo'], markersize=15, alpha=.5, cmap=None, legend_loc=None):
         '''
         plot trajactory within time_range: [[a0,b0],[a1,b1]...]
@@ -0,0 +1,34 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.analysis.core import sliding_window_to_feature
+from spiketag.analysis.place_field import place_field
+
+def _sliding_window_loop(scv, B_bins):
+    return np.stack([scv[i:i+B_bins] for i in range(scv.shape[0]-B_bins+1)])
+
+class TestSlidingWindow(unittest.TestCase):
+
+    def test_sliding_window_to_feature(self):
+
+        rng = np.random.RandomState(0)
+        scv = rng.poisson(2, size=(200, 12)).astype(np.float32)
+        for B_bins in [1, 4, 200]:
+            feature = sliding_window_to_feature(scv, B_bins)
+            np.testing.assert_array_equal(feature, _sliding_window_loop(scv, B_bins))
+            self.assertFalse(feature.flags.writeable)
+        # non C-contiguous scv (strides are taken from the input)
+        scv_f = np.asfortranarray(scv)
+        np.testing.assert_array_equal(sliding_window_to_feature(scv_f, 4), _sliding_window_loop(scv_f, 4))
+
+    def test_get_scv_B_bins(self):
+
+        rng = np.random.RandomState(1)
+        pc = place_field.__new__(place_field)
+        pc.ts = np.arange(0, 100, 0.1)
+        pc.spk_time_dict = {i: np.sort(rng.uniform(0, 100, 300)) for i in range(5)}
+
+        scv = pc.get_scv(t_window=0.1).copy()
+        feature = pc.get_scv(t_window=0.1, B_bins=8)
+        np.testing.assert_array_equal(feature, _sliding_window_loop(scv, 8))
@@ -0,0 +1,45 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.analysis.place_field import place_field
+
+class TestTrialTime(unittest.TestCase):
+
+    def _place_field(self, v_smoothed, pos):
+        pc = place_field.__new__(place_field)
+        pc.ts = np.arange(len(v_smoothed), dtype=np.float64)
+        pc.pos = pos
+        pc.v_smoothed = v_smoothed
+        pc.v_cutoff = 5
+        return pc
+
+    def test_one_trial_per_goal_arrival(self):
+
+        v_smoothed = np.zeros(20)
+        v_smoothed[[2, 3]] = 10           # crossing at 2, slows down again before the goal (false start)
+        v_smoothed[6:11] = 10             # crossing at 6, reaches the goal at 9
+        v_smoothed[12:17] = 10            # crossing at 12, reaches the goal at 15
+        v_smoothed[18] = 10               # crossing at 18, never reaches the goal
+        pos = np.zeros((20, 2))
+        pos[[9, 10, 15, 16]] = [100, 100]
+
+        pc = self._place_field(v_smoothed, pos)
+        trial_time = pc.get_trial_time(goal_pos=[100, 100], goal_radius=5)
+
+        np.testing.assert_array_equal(trial_time, [[6, 9], [12, 15]])
+        self.assertTrue(np.all(trial_time[1:, 0] > trial_time[:-1, 1]))
+
+    def test_no_trial_while_at_goal(self):
+
+        v_smoothed = np.zeros(20)
+        v_smoothed[6:9] = 10              # crossing at 6, reaches the goal at 9
+        v_smoothed[10:13] = 10            # crossing at 10, the animal is still at the goal
+        pos = np.zeros((20, 2))
+        pos[9:14] = [100, 100]
+
+        pc = self._place_field(v_smoothed, pos)
+        trial_time = pc.get_trial_time(goal_pos=[100, 100], goal_radius=5)
+
+        np.testing.assert_array_equal(trial_time, [[6, 9]])
+        self.assertTrue(np.all(trial_time[:, 1] > trial_time[:, 0]))
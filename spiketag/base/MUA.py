@@ -24,18 +24,41 @@ def find_spk_in_time_seg(spk_times, time_segs):
 
 @njit(cache=True, parallel=True)
 def _to_spk(data, pos, chlist, spklen=19, prelen=7, cutoff_neg=-5000, cutoff_pos=1000):
-    nspks = len(pos)
-    spk = np.zeros((nspks, spklen, len(chlist)), dtype=np.float32)
+    '''
+    extract spike waveforms (nspks, spklen, len(chlist)), each spike is gathered by its own thread
+    spikes with any sample outside (cutoff_neg, cutoff_pos) are set to 0, so are the chlist==-1 channels
+    '''
+    nspks, nch = pos.shape[0], chlist.shape[0]
+    spk = np.empty((nspks, spklen, nch), dtype=np.float32)
     for i in prange(nspks):
-        spike_wav = data[pos[i]-prelen:pos[i]-prelen+spklen, chlist]
-        peaks = spike_wav.reshape(1,-1)
-        if peaks.min()>cutoff_neg and peaks.max()<cutoff_pos: 
-            spk[i, ...] = spike_wav
-    _nan = np.where(chlist==-1)[0]
-    spk[..., _nan] = 0
+        base = pos[i]-prelen
+        _min = _max = data[base, chlist[0]]
+        for t in range(spklen):
+            for c in range(nch):
+                v = data[base+t, chlist[c]]
+                _min, _max = min(_min, v), max(_max, v)
+                spk[i, t, c] = 0.0 if chlist[c] == -1 else v
+        if not (_min > cutoff_neg and _max < cutoff_pos):
+            spk[i] = 0.0
     return spk 
 
 
+def _bucket_by_group(pivotal_pos, grp_dict, n_ch):
+    '''
+    stable bucket sort of pivotal_pos (2, nspk) by the group of its pivotal channel, spikes keep their time
+    order within a group and spikes of group g are grp_pos[:, bounds[g]:bounds[g+1]]
+    -1 (padding) channels in grp_dict belong to no group, spikes on channels of no group are dropped
+    '''
+    ch2g = np.full(n_ch, -1, dtype=np.int32)
+    for g, chs in grp_dict.items():
+        chs = np.asarray(chs)
+        ch2g[chs[chs >= 0]] = g
+    g_of_spk = ch2g[pivotal_pos[1]]
+    order = np.argsort(g_of_spk, kind='stable')
+    bounds = np.searchsorted(g_of_spk[order], np.arange(max(grp_dict.keys())+2))
+    return pivotal_pos[:, order], bounds
+
+
 def idx_still_spike(time_spike, time_still, dt):
     idx = np.searchsorted(time_still, time_spike) - 1
     dd = time_spike - time_still[idx]
@@ -95,16 +118,16 @@ class MUA(object):
         # self.spk_file = self.mua_file[:-4] + '.spk.bin'
         if spk_filename is not None:
             self.spk_file = spk_filename
-            spk_meta = np.fromfile(self.spk_file, dtype='<i4')
-            self.pivotal_pos = spk_meta.reshape(-1,2).T
+            # read-only memmap, only the kept spikes are materialized in memory (once)
+            spk_meta = np.memmap(self.spk_file, dtype='<i4', mode='r')
+            pivotal_pos = spk_meta.reshape(-1,2).T
 
             # check spike is extracable
             # delete begin AND end
-            self.pivotal_pos = np.delete(self.pivotal_pos, 
-                               np.where((self.pivotal_pos[0] + self.spklen) > self.data.shape[0])[0], axis=1)
-
-            self.pivotal_pos = np.delete(self.pivotal_pos, 
-                               np.where((self.pivotal_pos[0] - self.prelen) < 0)[0], axis=1)        
+            keep = np.ones(pivotal_pos.shape[1], dtype=bool)
+            keep[(pivotal_pos[0] + self.spklen) > self.data.shape[0]] = False
+            keep[(pivotal_pos[0] - self.prelen) < 0] = False
+            self.pivotal_pos = pivotal_pos[:, keep]
 
             if lfp:
                 self.pivotal_pos[0] -= 20
@@ -124,11 +147,19 @@ class MUA(object):
         data = self.data[:, nchs].astype(dtype)
         data.tofile(file_name)
 
+    def _grp_spk_times(self, group_id):
+        '''
+        pivotal times of the spikes of `group_id`, the bucket sort of pivotal_pos by group is done once and 
+        redone whenever self.pivotal_pos is replaced (e.g. by remove_high_corr_noise)
+        '''
+        if getattr(self, '_bucketed_pos', None) is not self.pivotal_pos:
+            self._grp_pivotal_pos, self._grp_bounds = _bucket_by_group(self.pivotal_pos, self.probe.grp_dict, self.nCh)
+            self._bucketed_pos = self.pivotal_pos
+        return self._grp_pivotal_pos[0, self._grp_bounds[group_id]:self._grp_bounds[group_id+1]]
+
     def _get_spk_times(self, group_id, time_segs, method='spk_info'):
         if method == 'spk_info':
-            pivotal_pos = self.pivotal_pos
-            pivotal_chs = self.probe[group_id]
-            spk_times = pivotal_pos[0][np.in1d(pivotal_pos[1], pivotal_chs)]
+            spk_times = self._grp_spk_times(group_id)
             spk_times = find_spk_in_time_seg(spk_times, time_segs*self.fs)
         return spk_times
 
@@ -136,6 +167,7 @@ class MUA(object):
         pivotal_chs = self.probe[group_id]
         spk_times   = self._get_spk_times(group_id, time_segs, method)
         if spk_times.shape[0] > 0:
+            # only the spike windows are gathered, the recording itself is never copied
             spks    = _to_spk(data   = self.data, 
                               pos    = spk_times, 
                               chlist = pivotal_chs, 
@@ -155,10 +187,8 @@ class MUA(object):
         spk shape: (N, 19, 4): N is #spks, 19 is the spk_len, 4 is the ch_len
         need to find the noisy spikes (they are already put to all 0)
         '''
-        noise_idx = np.where(spks.sum(axis=1).sum(axis=1)==0)[0]
-        spks = np.delete(spks, noise_idx, axis=0)
-        spk_times = np.delete(spk_times, noise_idx, axis=0)
-        return spks, spk_times, len(noise_idx)
+        keep = spks.sum(axis=1).sum(axis=1)!=0
+        return spks[keep], spk_times[keep], keep.shape[0] - np.count_nonzero(keep)
 
     def tospk(self, amp_cutoff=True, speed_cutoff=False, time_cutoff=True):
         info('mua.tospk() with time_cutoff={}, amp_cutoff={}, speed_cutoff={}'.format(
@@ -182,8 +212,10 @@ class MUA(object):
                 n_idx_still = float(idx_still.shape[0])
                 n_spk       = float(self.spk_times[g].shape[0])
                 info('group {} delete {}%({}/{}) spks via speed'.format(g, n_idx_still/n_spk*100, n_idx_still, n_spk))
-                self.spkdict[g]   = np.delete(self.spkdict[g],   idx_still, axis=0)
-                self.spk_times[g] = np.delete(self.spk_times[g], idx_still, axis=0)
+                keep = np.ones(self.spk_times[g].shape[0], dtype=bool)
+                keep[idx_still] = False
+                self.spkdict[g]   = self.spkdict[g][keep]
+                self.spk_times[g] = self.spk_times[g][keep]
 
         # check 0 spks case, fill in some random noise
         for g in self.probe.grp_dict.keys():
@@ -194,57 +226,34 @@ class MUA(object):
         info(' ')               
         return SPK(self.spkdict)
 
-    def get_nid(self, corr_cutoff=0.95):  # get noisy spk id
-        # 1. dump spikes file (binary)
+    def get_nid(self, corr_cutoff=0.95, batch_size=4096):  # get noisy spk id
+        '''
+        a spike is noise when most of its channel pairs (channel 16 onwards) are highly correlated
+        within the 10 samples around the peak, i.e. the median of |corrcoef| > corr_cutoff is 1
+        all spikes in a batch are screened together with one batched matrix product
+        '''
         piv = self.pivotal_pos.T
         nspk = self.pivotal_pos.shape[1]
         # the reason adding mod operation here is if the spike is in the very end ,i.e: within 15 offset to end 
         # point, this will make self.data[rows, :] out of bound.
-        rows = (np.arange(-10,15).reshape(1,-1) + piv[:,0].reshape(-1,1)) % self.data.shape[0]
-        cols = piv[:,1].reshape(-1,1)
-        full_spk = self.data[rows, :]
-        filename = os.path.dirname(self.filename)+'/.'+os.path.basename(self.filename)+'.spkfull'
-        full_spk.tofile(filename)
-
-        # 2. parallel screen the noise id out, then gather from CPUs
-        from ipyparallel import Client
-        from ipyparallel.util import interactive
-        rc = Client()
-        cpu = rc[:]
-        cpu.block = True
-
-        @cpu.remote(block=True)      # to be executed by cpu
-        @interactive                 # to be on the global()
-        def get_noise_ids(filename, corr_cutoff, n_group):
-            spk_data = np.memmap(filename, dtype='f4').reshape(-1, 25, n_group)
-            noise_id = []
-            # corr_cutoff = 0.98
-            # ind is index assign to each cpu
-            # corr_cutoff is threshold of corr_coef
-            for i in ind:
-                spikes = spk_data[i]
-                seq = np.abs(np.corrcoef(spikes[5:15, 16:].T).ravel())
-                seq[seq>corr_cutoff] = 1
-                seq[seq<corr_cutoff] = 0
-                if np.median(seq) == 1.0:
-                    noise_id.append(i)
-            return noise_id
-
-        # f = interactive(get_noise_ids)
-        cpu.execute('import numpy as np')
-        cpu.scatter('ind', range(nspk))
-        noise_id = get_noise_ids(filename, corr_cutoff, self.probe.n_group)
-        # cpu.execute("%reset")
-        try:
-            os.remove(filename)
-        except OSError:
-            pass
-        return np.hstack(np.asarray(noise_id))
+        rows = (np.arange(-5,5).reshape(1,-1) + piv[:,0].reshape(-1,1)) % self.data.shape[0]
+        data = self.data[:, 16:]
+        noise_id = [np.array([], dtype=int)]
+        for start in range(0, nspk, batch_size):
+            X = data[rows[start:start+batch_size]].astype(np.float32)   # (batch, 10, n_ch-16)
+            X -= X.mean(axis=1, keepdims=True)
+            norm = np.linalg.norm(X, axis=1)
+            C = np.einsum('nti,ntj->nij', X, X) / (norm[:,:,None]*norm[:,None,:] + 1e-9)
+            seq = (np.abs(C) > corr_cutoff).reshape(C.shape[0], -1)
+            noise_id.append(start + np.nonzero(np.median(seq, axis=1) >= 1.0)[0])
+        return np.hstack(noise_id)
 
 
     def remove_high_corr_noise(self, corr_cutoff=0.95):
         nid = self.get_nid(corr_cutoff)
-        self.pivotal_pos = np.delete(self.pivotal_pos, nid, axis=1)
+        keep = np.ones(self.pivotal_pos.shape[1], dtype=bool)
+        keep[nid] = False
+        self.pivotal_pos = self.pivotal_pos[:, keep]
         info('removed noise ids: {} '.format(nid)) 
 
     # def remove_groups_under_fetlen(self, fetlen):
@@ -262,8 +271,7 @@ class MUA(object):
     def group_spk_times(self):
         group_with_times = {}
         for g in range(self.probe.n_group):
-            pos   = self.pivotal_pos[0][np.in1d(self.pivotal_pos[1], pivotal_chs)]
-            times = self.pivotal_pos[0][np.where(np.in1d(self.pivotal_pos[1],self.probe[g]))[0]]
+            times = self._grp_spk_times(g)
             if len(times) > 0: group_with_times[g] = times
         return group_with_times
 
@@ -226,7 +226,7 @@ class BaseProbe(EventEmitter):
         '''
         chs = np.hstack((self.chs, self.mask_chs))
         assert(chs.shape[0] == self.n_ch)
-        self._ch_idx = np.squeeze(np.array([np.where(chs==ch)[0] for ch in np.arange(self.n_ch)]))
+        self._ch_idx = np.argsort(chs, kind='stable')  # chs is a permutation of np.arange(n_ch)
         return self._ch_idx
 
     def __str__(self):
@@ -268,10 +268,10 @@ class probe(BaseProbe):
         self._fs = fs
         self._group_len = group_len
         if grp_No is None:
-            self._n_group = int(self._n_ch / self._group_len)
+            self._n_group = self._n_ch // self._group_len
         else:
             self._n_group = grp_No
-        self.sorting_status = np.zeros((self._n_group,)).astype(np.int)
+        self.sorting_status = np.zeros((self._n_group,), dtype=int)
 
         # init with a already existing probe file
         if prbfile is not None:
@@ -467,7 +467,7 @@ if __name__ == '__main__':
 #         assert n_ch > 0, 'amount of chs should be positive'
 #         if not gmaps:
 #             gmaps = {}
-#             for g in range(n_ch/4):
+#             for g in range(n_ch//4):
 #                gmaps[g] = np.arange(g*4, g*4+4)
 #         return TetrodeProbe(fs, n_ch, gmaps)
 
@@ -580,7 +580,7 @@ if __name__ == '__main__':
 #         assert group >= 0 and group < self._n_group
 
 #         chs = self._g2chs[group]
-#         return np.asarray([chs[len(chs)/2]])
+#         return np.asarray([chs[len(chs)//2]])
 
 #     def _update_chs2group(self, chs, g):
 #        for ch in chs:
@@ -1,5 +1,4 @@
 import numpy as np
-import numexpr as ne
 # from spiketag.view import spike_view
 from .FET import FET
 from ..utils.conf import info
@@ -37,8 +36,9 @@ def _construct_transformer(x, ncomp=6):
 
 def _to_fet(_spk_array, _weight_vector, method='weighted-pca', ncomp=6, whiten=False):
 
-    X = _spk_array.transpose(0,2,1).ravel().reshape(-1, _spk_array.shape[1]*_spk_array.shape[2])
-    W = _weight_vector
+    # one contiguous float32 copy (channel-major rows), the weighted methods then scale it in place
+    X = np.array(_spk_array.transpose(0,2,1), dtype=np.float32, order='C').reshape(_spk_array.shape[0], -1)
+    W = _weight_vector.astype(np.float32, copy=False)
 
     if isinstance(method, int):
         fet = _spk_array[:, method, :]
@@ -68,27 +68,12 @@ def _to_fet(_spk_array, _weight_vector, method='weighted-pca', ncomp=6, whiten=F
             fet = np.empty((0, ncomp), dtype=np.float32)
 
     elif method == 'weighted-pca':
-        ne.set_num_threads(32)
-        from sklearn.decomposition import PCA
-        pca = PCA(n_components=ncomp, whiten=whiten)
         if _spk_array.shape[0] >= ncomp:
             # step 0
-            X = ne.evaluate('X*W')
-            # step 1
-            temp_fet = pca.fit(X)
-            # pca_comp[i] = pca.components_.T
-            pca_comp = np.floor(pca.components_.T*(2**7))/(2**7)
-            temp_fet = np.dot(X, pca_comp)
-            # pca_comp[i] = pca.components_.T
-            # step 2
-            shift = -np.dot(X.mean(axis=0), pca.components_.T)
-            temp_fet += shift
-            # step 3
-            scale = temp_fet.max()-temp_fet.min()
-            temp_fet /= scale
-            # quantization for FPGA
-            fet = temp_fet
-            # fet[i] = np.floor(temp_fet*2**8)/(2**8)
+            X *= W
+            # step 1-3: the same PCA, 8 bit components, shift and scale as the FPGA transformer
+            pca_comp, shift, scale = _construct_transformer(X, ncomp)
+            fet = _transform(X, pca_comp, shift, scale)
         else:
             # keep same shape even no feature value, for future
             # convinience.
@@ -101,10 +86,9 @@ def _to_fet(_spk_array, _weight_vector, method='weighted-pca', ncomp=6, whiten=F
         fet = temp_fet/(temp_fet.max()-temp_fet.min()) 
 
     elif method == 'weighted-ica':
-        ne.set_num_threads(32)
         from sklearn.decomposition import FastICA
         ica = FastICA(n_components=3, whiten=True)  # ICA must be whitened
-        X = ne.evaluate('X*W')
+        X *= W
         temp_fet = ica.fit_transform(X)
         fet = temp_fet/(temp_fet.max()-temp_fet.min()) 
 
@@ -129,7 +113,7 @@ class SPK():
         W = weight_channel * weight_vector.reshape(-1,1)
         self.W = W.T.ravel()
 
-        self.W = np.ones((self.spklen*self.ch_span,)).astype(np.float32) # for tetrode
+        self.W = np.ones((self.spklen*self.ch_span,), dtype=np.float32) # for tetrode
 
 
     @property
@@ -177,8 +161,13 @@ class SPK():
         if group_id is not None:
             return self._tofet(group_id, method, ncomp, whiten)
         else:
-            for group in self.spk.keys():
-                fet[group] = self._tofet(group, method, ncomp, whiten)
+            # groups are independent and the heavy lifting (BLAS) releases the GIL, so use threads
+            from joblib import Parallel, delayed
+            groups = list(self.spk.keys())
+            results = Parallel(n_jobs=-1, prefer='threads')(delayed(self._tofet)(group, method, ncomp, whiten) 
+                                                            for group in groups)
+            for group, _fet in zip(groups, results):
+                fet[group] = _fet
                 info('group[{}]:{} spikes'.format(group, fet[group].shape[0]))
                 info('spk._tofet(group_id={}, method={}, ncomp={}, whiten={})'.format(group, method, ncomp, whiten))
             info('----------------success------------------')
@@ -74,6 +74,9 @@ class SPKTAG(object):
         meta["fetlen"] = self.fetlen
         meta["spklen"] = self.spklen
         meta["clu_statelist"] = self.clu_manager.state_list
+        # rows of each group are contiguous in spktag: group_offsets[i]:group_offsets[i+1] is groups[i]
+        meta["groups"] = [int(g) for g in self.gtimes.keys()]
+        meta["group_offsets"] = np.hstack((0, np.cumsum([len(v) for v in self.gtimes.values()]))).astype(int).tolist()
         return meta
 
     def build_hdbscan_tree(self):
@@ -85,18 +88,35 @@ class SPKTAG(object):
                 treeinfo[i] = None
         return treeinfo
 
-    def build_spktag(self):
-        spktag = np.zeros(self.nspk, dtype=self.dtype)
+    def build_spktag(self, filename=None):
+        '''
+        if filename is given, spktag is filled directly into a memmap of that file (no second copy when saving)
+        every row is assigned below, so the array can start uninitialized
+        the rows of each group are recorded in self._group_slices for tospk/tofet/toclu/to_gtimes
+        '''
+        self._group_slices = {}
+        if self.nspk == 0:
+            # a file can not be memory mapped with zero length, an empty spktag is an empty file
+            if filename is not None:
+                open(filename, 'wb').close()
+            return np.empty(0, dtype=self.dtype)
+        if filename is not None:
+            spktag = np.memmap(filename, dtype=self.dtype, mode='w+', shape=(self.nspk,))
+        else:
+            spktag = np.empty(self.nspk, dtype=self.dtype)
         start_index = 0
         for g, times in self.gtimes.items():
             if times.shape[0] > 0:
                 end_index = start_index + len(times)
                 spktag['t'][start_index:end_index] = times
-                spktag['group'][start_index:end_index] = np.full((len(times)), g, dtype=np.int)
+                spktag['group'][start_index:end_index] = g
                 spktag['spk'][start_index:end_index] = self.spk[g]
                 spktag['fet'][start_index:end_index] = self.fet[g]        
                 spktag['clu'][start_index:end_index] = self.clu[g].membership
+                self._group_slices[int(g)] = slice(start_index, end_index)
                 start_index = end_index
+        if filename is not None:
+            spktag.flush()
         return spktag
 
 
@@ -129,12 +149,11 @@ class SPKTAG(object):
     def tofile(self, filename, including_noise=False):
         self.meta = self.build_meta()
         self.treeinfo = self.build_hdbscan_tree()
-        self.spktag = self.build_spktag()
+        self.spktag = self.build_spktag(filename)   # numpy to file
         self.spkid_matrix = self.build_spkid_matrix(including_noise=including_noise)
         with open(filename+'.meta', 'w') as metafile:
                 json.dump(self.meta, metafile, indent=4)
         np.save(filename+'.npy', self.treeinfo)
-        self.spktag.tofile(filename)   # numpy to file
         self.spkid_matrix.to_pickle(filename+'.pd')  # pandas data frame
 
 
@@ -159,16 +178,39 @@ class SPKTAG(object):
                       ('fet', 'f4', (self.fetlen,)),
                       ('clu', 'int32')]
         self.spktag = np.fromfile(filename, dtype=self.dtype)
+        self._group_slices = self._get_group_slices()
         try:
             self.spkid_matrix = pd.read_pickle(filename+'.pd')
         except:
             pass
 
 
+    def _get_group_slices(self):
+        '''
+        {group: slice} of the non-empty groups in spktag, from the `group_offsets` in meta
+        spktag files saved without `group_offsets` are still contiguous per group, so find where each group starts
+        '''
+        if 'group_offsets' in self.meta:
+            groups, offsets = self.meta['groups'], self.meta['group_offsets']
+        else:
+            groups, first = np.unique(self.spktag['group'], return_index=True)
+            order = np.argsort(first)
+            groups, offsets = groups[order], np.hstack((first[order], self.spktag.shape[0]))
+        return {int(g): slice(offsets[i], offsets[i+1]) for i, g in enumerate(groups) if offsets[i+1] > offsets[i]}
+
+
+    def _group_rows(self, field, g):
+        '''
+        C-contiguous copy of `field` of group g (empty for a group without spikes), like the boolean indexing it replaces
+        a slice of a structured array field is a strided view into spktag, and CLU keeps and changes its membership
+        '''
+        return np.ascontiguousarray(self.spktag[field][self._group_slices.get(int(g), slice(0, 0))])
+
+
     def tospk(self):
         spkdict = {}
         for g in self.gtimes.keys():
-            spkdict[g] = self.spktag['spk'][self.spktag['group']==g]
+            spkdict[g] = self._group_rows('spk', g)
         self.spk = SPK(spkdict)
         return self.spk		
 
@@ -176,7 +218,7 @@ class SPKTAG(object):
     def tofet(self):
         fetdict = {}
         for g in self.gtimes.keys():
-            fetdict[g] = self.spktag['fet'][self.spktag['group']==g]
+            fetdict[g] = self._group_rows('fet', g)
         self.fet = FET(fetdict)
         return self.fet		
 
@@ -184,7 +226,7 @@ class SPKTAG(object):
     def toclu(self):
         cludict = {}
         for g in self.gtimes.keys():
-            cludict[g] = CLU(self.spktag['clu'][self.spktag['group']==g], treeinfo=self.treeinfo[g])
+            cludict[g] = CLU(self._group_rows('clu', g), treeinfo=self.treeinfo[g])
             cludict[g]._id    = g
             cludict[g]._state = cludict[g].s[self.clu_statelist[g]]
         self.clu = cludict
@@ -192,11 +234,9 @@ class SPKTAG(object):
 
 
     def to_gtimes(self):
-        times = self.spktag['t']
-        groups = self.spktag['group']
         gtimes = {}
-        for g in np.unique(groups):
-            gtimes[g] = times[np.where(groups == g)[0]]
+        for g in self._group_slices.keys():
+            gtimes[g] = self._group_rows('t', g)
         self.gtimes = gtimes
         return self.gtimes
 
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import pandas as pd
 
@@ -8,6 +9,27 @@ class UNIT(object):
     """
     def __init__(self):
         super(UNIT, self).__init__()
+        self._df = None
+
+    @property
+    def df(self):
+        '''
+        the `.bin` fast path only keeps numpy arrays (spike_time, group_id, fet, spike_id),
+        the pandas dataframe is built from them on first access
+        '''
+        if self._df is None:
+            self._df = pd.DataFrame({'time':     self.spike_time,
+                                     'group_id': self.group_id,
+                                     'fet0':     self.fet[:, 0],
+                                     'fet1':     self.fet[:, 1],
+                                     'fet2':     self.fet[:, 2],
+                                     'fet3':     self.fet[:, 3],
+                                     'spike_id': self.spike_id})
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
 
     def load_all(self, filename):
         pass
@@ -20,30 +42,56 @@ class UNIT(object):
         Both follows table structure:
         ['time', 'group_id', 'fet0', 'fet1', 'fet2', 'fet3', 'spike_id']
         '''
-        if filename.split('.')[-1]=='pd':
-            self.df = pd.read_pickle(filename)
-            self.df['frame_id'] /= 25000.
-            self.df.rename(columns={'frame_id':'time'}, inplace=True)
-            self.df['group_id'] = self.df['group_id'].astype('int')
-            self.df['spike_id'] = self.df['spike_id'].astype('int')
-            # self.df.set_index('spike_id', inplace=True)
-            # self.df.index = self.df.index.astype(int)
-            # self.df.index -= self.df.index.min()
-            # self.df['spk'] = self.df
-            # self.spk_time_dict = {i: self.df.loc[i]['time'].to_numpy() 
-            #                       for i in self.df.index.unique().sort_values()}
-            # self.df['spk'].reset_index(inplace=True)
-            # self.n_units = np.sort(self.df.spike_id.unique()).shape[0]
-            # self.n_groups = np.sort(self.df.group_id.unique()).shape[0]
-
-        elif filename.split('.')[-1]=='bin':
-            fet = np.fromfile(filename, dtype=np.int32).reshape(-1, 7).astype(np.float32)
-            fet[:, 2:6] /= float(2**16)
-            self.df = pd.DataFrame(fet,
-                      columns=['time', 'group_id', 'fet0', 'fet1', 'fet2', 'fet3', 'spike_id'])
-            self.df['time'] /= 25000.
-            self.df['group_id'] = self.df['group_id'].astype('int')
-            self.df['spike_id'] = self.df['spike_id'].astype('int')
+        ext = filename.rsplit('.', 1)[-1]
+        if ext == 'pd':
+            self._load_pd(filename)
+        elif ext == 'bin':
+            self._load_bin(filename)
+
+    def _load_pd(self, filename):
+        self._df = pd.read_pickle(filename)
+        # frame_id -> time (same column position), divided in place in float64: float32 cannot hold
+        # frame ids of long recordings exactly
+        loc = self.df.columns.get_loc('frame_id')
+        time = self.df.pop('frame_id').to_numpy(dtype=np.float64)
+        np.divide(time, 25000., out=time)
+        self.df.insert(loc, 'time', time)
+        self.df['group_id'] = self.df['group_id'].astype(np.int32, copy=False)
+        self.df['spike_id'] = self.df['spike_id'].astype(np.int32, copy=False)
+        # self.df.set_index('spike_id', inplace=True)
+        # self.df.index = self.df.index.astype(int)
+        # self.df.index -= self.df.index.min()
+        # self.df['spk'] = self.df
+        # self.spk_time_dict = {i: self.df.loc[i]['time'].to_numpy() 
+        #                       for i in self.df.index.unique().sort_values()}
+        # self.df['spk'].reset_index(inplace=True)
+        # self.n_units = np.sort(self.df.spike_id.unique()).shape[0]
+        # self.n_groups = np.sort(self.df.group_id.unique()).shape[0]
+        self.spike_time = self.df['time'].to_numpy()
+        self.group_id   = self.df['group_id'].to_numpy()
+        self.fet        = self.df[['fet0', 'fet1', 'fet2', 'fet3']].to_numpy()
+        self.spike_id   = self.df['spike_id'].to_numpy()
+
+    def _load_bin(self, filename):
+        # group_id and spike_id stay int32 (copied straight from the file), only time and fet are converted 
+        # to float32, chunk by chunk from the int32 memmap, so only the float32 copy is resident
+        if os.path.getsize(filename) == 0:
+            # no spike yet (e.g. a live session), an empty file can not be memory mapped
+            raw = np.empty((0, 7), dtype=np.int32)
+        else:
+            raw = np.memmap(filename, dtype=np.int32, mode='r').reshape(-1, 7)
+        group_id, spike_id = np.array(raw[:, 1]), np.array(raw[:, 6])
+        fet = np.empty((raw.shape[0], 5), dtype=np.float32)  # time, fet0, fet1, fet2, fet3
+        chunk = 1<<20
+        for i in range(0, raw.shape[0], chunk):
+            fet[i:i+chunk, 0]  = raw[i:i+chunk, 0]
+            fet[i:i+chunk, 1:] = raw[i:i+chunk, 2:6]
+            np.multiply(fet[i:i+chunk, 1:], np.float32(1.0/(1<<16)), out=fet[i:i+chunk, 1:])  # fixed point (16 bits fraction) to float
+        del raw
+        fet[:, 0] /= np.float32(25000.)
+        # numeric arrays only, `self.df` is built lazily from them
+        self.spike_time, self.group_id, self.fet, self.spike_id = fet[:, 0], group_id, fet[:, 1:], spike_id
+        self._df = None
 
     def load_behavior(self, filename):
         pass
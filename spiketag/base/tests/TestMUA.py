@@ -0,0 +1,24 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.base.MUA import _bucket_by_group
+
+class TestMUA(unittest.TestCase):
+
+    def test_bucket_by_group(self):
+
+        # linear probe style groups, the -1 padding channels must not pull the last channel into a group
+        grp_dict = {0: np.array([-1, 0, 1]), 1: np.array([1, 2, 3]), 2: np.array([4, 5, -1])}
+        n_ch = 7
+        rng = np.random.RandomState(0)
+        pivotal_pos = np.vstack((np.sort(rng.randint(0, 10000, 500)), rng.randint(0, n_ch, 500)))
+
+        grp_pos, bounds = _bucket_by_group(pivotal_pos, grp_dict, n_ch)
+
+        # channel 1 is in two groups, the later group owns it (same as Probe.ch2g), channel 6 has no group
+        expected_chs = {0: [0], 1: [1, 2, 3], 2: [4, 5]}
+        for g, chs in expected_chs.items():
+            expected = pivotal_pos[:, np.in1d(pivotal_pos[1], chs)]
+            np.testing.assert_array_equal(grp_pos[:, bounds[g]:bounds[g+1]], expected)
+        self.assertEqual(bounds[-1] - bounds[0], np.count_nonzero(pivotal_pos[1] != 6))
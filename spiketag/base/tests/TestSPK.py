@@ -0,0 +1,31 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.base.SPK import SPK, _construct_transformer, _transform
+
+class TestSPK(unittest.TestCase):
+
+    def _spikes(self, rng, n):
+        '''
+        spikes made of 4 templates with well separated variances, so the principal components are well defined
+        (on white noise the solver may return a different basis on every fit)
+        '''
+        templates = rng.randn(4, 19, 4)
+        amp = rng.randn(n, 4) * [8, 6, 4, 2]
+        return (np.einsum('nk,kij->nij', amp, templates) + 0.1*rng.randn(n, 19, 4)).astype(np.float32)
+
+    def test_weighted_pca_matches_transformer(self):
+
+        rng = np.random.RandomState(0)
+        spkdict = {0: self._spikes(rng, 2000),
+                   1: self._spikes(rng, 500)}
+        spk = SPK(spkdict)
+
+        for g in spkdict.keys():
+            fet = spk.tofet(group_id=g, method='weighted-pca', ncomp=4)
+            # the FPGA transformer params are built from the same spikes (Model._construct_transformer)
+            r = spk[g]
+            x = r.transpose(0,2,1).ravel().reshape(-1, r.shape[1]*r.shape[2])
+            pca_comp, shift, scale = _construct_transformer(x, ncomp=4)
+            np.testing.assert_allclose(fet, _transform(x, pca_comp, shift, scale), rtol=1e-5, atol=1e-6)
@@ -162,12 +162,9 @@ class controller(object):
 
         @self.view.traceview.event.connect
         def on_view_trace():
-            if self.current_group>min(self.prb.grp_dict.keys()) and self.current_group<max(self.prb.grp_dict.keys()):
-                vchs = np.hstack((self.prb[self.current_group-1], self.prb[self.current_group], self.prb[self.current_group+1]))
-            elif self.current_group == min(self.prb.grp_dict.keys()):
-                vchs = np.hstack((self.prb[self.current_group], self.prb[self.current_group+1]))
-            elif self.current_group == max(prb.grp_dict.keys()):
-                vchs = np.hstack((self.prb[self.current_group-1], self.prb[self.current_group]))
+            # channels of the current group and its neighbours
+            vgroups = [g for g in (self.current_group-1, self.current_group, self.current_group+1) if g in self.prb.grp_dict]
+            vchs = np.concatenate([self.prb[g] for g in vgroups])
             if len(self.view.spkview.selected_spk) == 1:
                 current_time = self.model.mua.spk_times[self.current_group][self.view.spkview.selected_spk]/self.model.mua.fs
                 self.model.mua.show(time = current_time, chs=vchs)
@@ -26,6 +26,10 @@ uniform float u_npts;
 // Vertical gap
 uniform float u_gap;
 
+// Ring buffer slot that holds the first point of the page.
+uniform float u_head;
+varying float v_seam;
+
 // Color.
 attribute vec4 a_color;
 varying vec4 v_color;
@@ -34,8 +38,11 @@ void main() {
     float nrows = u_size.x;
     float ncols = u_size.y;
 
-    // Compute the x coordinate from the time index.
-    float x = -1 + 2*a_index.z / (u_npts-1);
+    // Compute the x coordinate from the time index, unwrapping the ring buffer.
+    // The extra last vertex (a_index.z == u_npts) repeats slot 0 so that the
+    // segment between the last and the first slot is drawn too.
+    float n = mod(a_index.z - u_head, u_npts);
+    float x = -1 + 2*n / (u_npts-1);
     vec2 position = vec2(x, y);
 
     // Find the affine transformation for the subplots.
@@ -48,6 +55,7 @@ void main() {
 
     v_color = a_color;
     v_index = a_index;
+    v_seam = (a_index.z < u_head || (a_index.z > u_npts - 0.5 && u_head < 0.5)) ? 1. : 0.;
 
 }
 """
@@ -61,12 +69,14 @@ FRAG_SHADER = """
 
 varying vec4 v_color;
 varying vec3 v_index;
+varying float v_seam;
 
 void main() {
     gl_FragColor = v_color;
 
-    // Discard the fragments between the signals (emulate glMultiDrawArrays).
-    if ((fract(v_index.x) > 0.) || (fract(v_index.y) > 0.))
+    // Discard the fragments between the signals (emulate glMultiDrawArrays),
+    // and the one between the last and the first point of the page.
+    if ((fract(v_index.x) > 0.) || (fract(v_index.y) > 0.) || (fract(v_seam) > 0.))
         discard;
 
 }
@@ -96,6 +106,10 @@ class MyWaveVisual(visuals.Visual):
     depend on the transformation functions used during drawing.
     """
 
+    # points highlighted before and after the peak of a spike
+    pre_peak  = 5
+    post_peak = 5
+
     # There are no constraints on the signature of the __init__ method; use
     # whatever makes the most sense for your visual.
     def __init__(self, ncols=1, color=None, ls='-', gap=1):
@@ -112,6 +126,10 @@ class MyWaveVisual(visuals.Visual):
         self.ls = ls
         self.gap = gap
         self._scale = 1
+        self._head = 0
+        self._vbo = None
+        self._cbo = None
+        self._color_dirty = False
         # self.pcie_open = False
         # self.pcie_read_open()
         # self.timer0 = app.Timer(interval=0, connect=self._timer_data, start=False)
@@ -151,17 +169,56 @@ class MyWaveVisual(visuals.Visual):
         for chNo in spacial_code:
             for nrange in temporal_code:
                 n0, n1 = nrange   # from n0 to n1
-                start  = int(n0+chNo*self.npts)
-                end    = int(n1+chNo*self.npts)
-                self.color[start:end,:] = np.asarray(highlight_color)       
-        self.shared_program['a_color'] = self.color
+                self.color[self._slots(chNo, n0, n1),:] = np.asarray(highlight_color)       
+        self._color_dirty = True
+        self._upload(self._cbo, self.color)
         self.update()
 
 
+    @property
+    def _stride(self):
+        '''
+        vertices per channel: the npts ring buffer slots and the seam vertex that repeats slot 0
+        '''
+        return self.npts + 1
+
+    def _slots(self, chNo, n0, n1):
+        '''
+        ring buffer slots of point n0 to point n1 of channel chNo
+        '''
+        n0, n1 = max(int(n0), 0), min(int(n1), self.npts)
+        offset = int(chNo)*self._stride
+        if self._head == 0:
+            return slice(offset+n0, offset+n1)
+        return offset + (np.arange(n0, n1) + self._head) % self.npts
+
+    def _upload(self, vbo, array, idx=None, max_runs=256):
+        '''
+        the seam vertex of every channel is set to its slot 0, then `array` is uploaded into `vbo`:
+        only the runs of consecutive vertices `idx` (and the seam vertices they change) when given, 
+        the whole array when idx is None or has more than max_runs runs
+        '''
+        if vbo is None:   # not rendered yet, _render uploads everything
+            return
+        a = array.reshape(self.nCh, self._stride, -1)
+        a[:, self.npts] = a[:, 0]
+        if idx is not None:
+            idx = np.unique(idx)
+            idx = np.union1d(idx, idx[idx % self._stride == 0] + self.npts)
+            breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+            if breaks.shape[0] < max_runs:
+                for s, e in zip(idx[np.r_[0, breaks]], idx[np.r_[breaks-1, -1]] + 1):
+                    vbo.set_subdata(array[s:e], offset=int(s))
+                return
+        vbo.set_data(array)
+
+    def _reset_color(self):
+        self.color = np.ones((self.nCh*self._stride, 4), dtype=np.float32)
+        self._color_dirty = False
+
     def highlight_reset(self):
-        self.color = np.repeat(np.ones((self.nCh,4)),
-                                        self.npts, axis=0).astype(np.float32)
-        self.shared_program['a_color'] = self.color
+        self._reset_color()
+        self._upload(self._cbo, self.color)
         self.update()
 
 
@@ -174,72 +231,113 @@ class MyWaveVisual(visuals.Visual):
         '''
         if highlight_color is None:
             highlight_color = (0,1,0,1)
-        npts = self.color.shape[0]/self.nCh
-        if isinstance(ch, int):
-            chNo = ch
-            n0, n1 = 0, npts   # from n0 to n1
-            start  = n0 + chNo*self.npts
-            end    = n1 + chNo*self.npts
-            self.color[start:end,:] = np.asarray(highlight_color)      
+        # (nCh, npts+1, 4) view, a whole channel is one row whatever the ring buffer head is
+        color = self.color.reshape(self.nCh, self._stride, 4)
+        if isinstance(ch, (int, np.integer)):
+            color[ch] = np.asarray(highlight_color)
             if mask_others is True:
-                mask = np.delete(np.arange(self.nCh), ch)
-                for chNo in mask:
-                    n0, n1 = 0, npts   # from n0 to n1
-                    start  = n0 + chNo*self.npts
-                    end    = n1 + chNo*self.npts
-                    self.color[start:end,:] = (0,0,0,0)                
+                color[np.arange(self.nCh) != ch] = (0,0,0,0)
 
         elif isinstance(ch, list) or isinstance(ch, tuple) or isinstance(ch, np.ndarray):
-            for i, chNo in enumerate(ch):
-                n0, n1 = 0, npts   # from n0 to n1
-                start  = n0 + chNo*self.npts
-                end    = n1 + chNo*self.npts
-                if np.ndim(highlight_color) == 1:
-                    self.color[start:end,:] = np.asarray(highlight_color)   
-                elif np.ndim(highlight_color) == 2:
-                    self.color[start:end,:] = np.asarray(highlight_color[i])   
+            ch = np.asarray(ch, dtype=np.int64)
+            highlight_color = np.asarray(highlight_color)
+            if highlight_color.ndim == 1:
+                color[ch] = highlight_color
+            elif highlight_color.ndim == 2:
+                color[ch] = highlight_color[:len(ch), np.newaxis, :]
             if mask_others is True:
-                mask = np.delete(np.arange(self.nCh), ch)
-                for chNo in mask:
-                    n0, n1 = 0, npts   # from n0 to n1
-                    start  = n0 + chNo*self.npts
-                    end    = n1 + chNo*self.npts
-                    self.color[start:end,:] = (1,1,1,0.5)    
-
-        self.shared_program['a_color'] = self.color
+                mask = np.ones(self.nCh, dtype=bool)
+                mask[ch] = False
+                color[mask] = (1,1,1,0.5)
+
+        self._color_dirty = True
+        self._upload(self._cbo, self.color)
         self.update()
 
 
     def highlight_spikes(self, highlight_list, color=(0,1,0,1)):
-        pre_peak  = 5
-        post_peak = 5
-        for tup in highlight_list:
-            temporal_code = [[tup[0]-pre_peak, tup[0]+post_peak]]
-            # print temporal_code
-            spacial_code = [tup[1],]
-            # print spacial_code
-            self.highlight(spacial_code, temporal_code, color)
+        '''
+        highlight_list is (n, 2) of (peak point, channel), points peak-pre_peak to peak+post_peak-1 are 
+        written into the color buffer first and only the changed runs are uploaded to the GPU
+        '''
+        spks = np.asarray(highlight_list, dtype=np.int64).reshape(-1, 2)
+        if spks.shape[0] == 0:
+            return
+        n  = spks[:, :1] + np.arange(-self.pre_peak, self.post_peak)
+        ch = np.broadcast_to(spks[:, 1:], n.shape)
+        valid = (n >= 0) & (n < self.npts)
+        slots = ch[valid]*self._stride + (n[valid] + self._head) % self.npts
+        self.color[slots,:] = np.asarray(color)
+        self._upload(self._cbo, self.color, slots)
+        self.update()
 
 
     def set_data(self, data):
         
-        self.data = data.astype('float32')
-        if self.data.ndim == 1:
-            self.data = self.data.reshape(-1,1)
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data.reshape(-1,1)
      
         ####### extract meta data from data #######
-        self.nCh = int(self.data.shape[1])
-        self.npts = int(self.data.shape[0])
+        self.nCh = int(data.shape[1])
+        self.npts = int(data.shape[0])
         self.nrows = int(self.nCh / self.ncols)
     
         ####### scale data #######
-        self._scale = self.data.max()-self.data.min()
-        self.data = self.data.T.ravel()/self._scale
+        # data can stay int16, it is cast and scaled into the float32 (nCh, npts+1) buffer in one pass
+        # the max/min of every point are kept (in ring buffer slot order) to get the scale of a rolled page
+        self._colmax, self._colmin = data.max(axis=1), data.min(axis=1)
+        self._scale = np.float32(float(self._colmax.max()) - float(self._colmin.min()))
+        y = np.empty((self.nCh, self._stride), dtype=np.float32)
+        np.multiply(data.T, 1./self._scale, out=y[:, :self.npts], casting='unsafe')
+        y[:, self.npts] = y[:, 0]
+        self.data = y.ravel()
         
-        self.highlight_reset()
+        self._head = 0
+        self._reset_color()
         
         self._render()
 
+    def roll(self, data, offset):
+        '''
+        scroll the signals by offset points, data (abs(offset), nCh) is the newly exposed segment
+        only data is uploaded, into the ring buffer slots of the points scrolled out, and the colors of those 
+        slots are reset (all colors are, when highlight or highlight_ch was used since the last reset)
+        the page is drawn exactly as set_data would draw it, so when the new segment changes the scale 
+        (max-min) of the page nothing is changed and False is returned: set_data the page instead
+        '''
+        n = abs(int(offset))
+        if n == 0:
+            return True
+        assert 0 < n < self.npts and self._vbo is not None
+
+        data = np.asarray(data)
+        first = self._head if offset > 0 else (self._head + offset) % self.npts
+        slots = (first + np.arange(n)) % self.npts
+        colmax, colmin = self._colmax.copy(), self._colmin.copy()
+        colmax[slots], colmin[slots] = data.max(axis=1), data.min(axis=1)
+        if np.float32(float(colmax.max()) - float(colmin.min())) != self._scale:
+            return False
+        self._colmax, self._colmin = colmax, colmin
+
+        y_new = np.empty((self.nCh, n), dtype=np.float32)
+        np.multiply(data.T, 1./self._scale, out=y_new, casting='unsafe')
+        y = self.data.reshape(self.nCh, self._stride)
+        y[:, slots] = y_new
+        idx = (np.arange(self.nCh)[:, None]*self._stride + slots).ravel()
+        self._upload(self._vbo, self.data, idx)
+
+        if self._color_dirty:
+            self.highlight_reset()
+        else:
+            self.color.reshape(self.nCh, self._stride, 4)[:, slots] = 1.
+            self._upload(self._cbo, self.color, idx)
+
+        self._head = (self._head + offset) % self.npts
+        self.shared_program['u_head'] = self._head
+        self.update()
+        return True
+
     def append_data(self, data):
         newdata = data.astype('float32')
         newdata = newdata.T.ravel()/self._scale
@@ -251,7 +349,7 @@ class MyWaveVisual(visuals.Visual):
             convert data to opengl position, then we can use this position to transform to other coordinate system, eg:
             document coordinate system or viewport coordinate system
         '''
-        x_pos = -1 + 2 * self.index[:,2]/ (self.npts - 1)
+        x_pos = -1 + 2 * ((self.index[:,2] - self._head) % self.npts)/ (self.npts - 1)
         y_pos = self.data
         pos = np.column_stack((x_pos,y_pos))
 
@@ -277,23 +375,31 @@ class MyWaveVisual(visuals.Visual):
 
         # (col,row):
         # (0,0)->(1,0)->(0,1)->(1,1)->(0,2)->(1,2)...->(0,7)->(1,7)
-        self.index = np.c_[np.repeat(np.tile(np.arange(self.ncols), self.nrows), self.npts),
-                      np.repeat(np.arange(self.nrows), self.ncols*self.npts),
-                      np.tile(np.arange(self.npts), self.nCh)].astype(np.float32)
+        # every channel has npts+1 vertices, the last one repeats slot 0 (see the vertex shader)
+        self.index = np.c_[np.repeat(np.tile(np.arange(self.ncols), self.nrows), self._stride),
+                      np.repeat(np.arange(self.nrows), self.ncols*self._stride),
+                      np.tile(np.arange(self._stride), self.nCh)].astype(np.float32)
         
         if self.color is 'random':
             self.color = np.repeat(np.random.uniform(size=(self.nCh, 4), low=.2, high=.9),
-                              self.npts, axis=0).astype(np.float32)            
+                              self._stride, axis=0).astype(np.float32)            
         elif self.color is None:
             self.color = np.repeat(np.ones((self.nCh,4)),
-                              self.npts, axis=0).astype(np.float32)
+                              self._stride, axis=0).astype(np.float32)
         
-        self.shared_program['y'] = self.data
-        self.shared_program['a_color'] = self.color
+        if self._vbo is None:
+            self._vbo = gloo.VertexBuffer(self.data)
+            self._cbo = gloo.VertexBuffer(self.color)
+        else:
+            self._vbo.set_data(self.data)
+            self._cbo.set_data(self.color)
+        self.shared_program['y'] = self._vbo
+        self.shared_program['a_color'] = self._cbo
         self.shared_program['a_index'] = self.index
         self.shared_program['u_size'] = (self.nrows, self.ncols)
         self.shared_program['u_npts'] = self.npts
         self.shared_program['u_gap'] = self.gap
+        self.shared_program['u_head'] = self._head
         # self.shared_program['clip'] = 1.0
 
         # self.shared_program.vert['position'] = self.vbo
@@ -0,0 +1,93 @@
+import numpy as np
+from vispy import scene
+
+
+class Axis(scene.AxisWidget):
+    """from scene.AxisWidget, shared by the cross of wave_view and trace_view"""
+    def __init__(self, *args, **kwargs):
+        super(Axis, self).__init__(*args, **kwargs)
+        self.unfreeze()
+        self._last_view_key = None
+        self.freeze()
+
+    def set_x_transform(self, x_transform):
+        self.glpos_to_time = x_transform
+
+    def set_y_transform(self, y_transform):
+        self.glpos_to_value = y_transform
+
+    def glpos_to_time(self, gl_pos):
+        '''
+        get time from the x postion of x_axis
+        Important: check the affine transformation in MyWaveVisual!
+        '''
+        xn = np.ceil((gl_pos / 0.95 + 1) * (self.npts - 1) / 2)
+        t = (xn + getattr(self, '_start_index', 0) + self._time_slice * self._time_span) / self.fs
+        return t
+
+
+    def glpos_to_value(self, gl_pos):
+        '''
+        get value from the y postion of y_axis
+        Important: check the affine transformation in MyWaveVisual!
+        '''
+        y = (gl_pos+1-1./self.nCh) / 0.95 * self.nCh
+        y = y*self.yscale
+        return y
+    
+    def _view_key(self):
+        '''
+        everything the axis domain depends on: its own placement, the camera and the time/value params
+        '''
+        cam = self._linked_view.camera.transform
+        return (tuple(self.transform.translate), tuple(self.pos), tuple(self.size),
+                tuple(cam.scale), tuple(cam.translate), self.npts, self.fs, self._time_slice, self._time_span,
+                getattr(self, '_start_index', 0), getattr(self, 'nCh', 0), getattr(self, 'yscale', 1))
+
+    def _view_changed(self, event=None):
+        """Linked view transform has changed; update ticks.
+        """
+        key = self._view_key()
+        if key == self._last_view_key:
+            return
+        self._last_view_key = key
+
+        tr = self.node_transform(self._linked_view.scene)
+        p1, p2 = tr.map(self._axis_ends())
+        if self.orientation in ('left', 'right'):
+            # yaxis
+            self.axis.domain = (self.glpos_to_value(p1[1]), self.glpos_to_value(p2[1]))
+            # self.axis.domain = (p1[1],p2[1])
+        else:
+            # xaxis
+            self.axis.domain = (self.glpos_to_time(p1[0]), self.glpos_to_time(p2[0]))
+
+
+def cursor_key(view, cross):
+    '''
+    everything the cursor texts of `view` depend on, update_cursor skips the re-layout if it is unchanged
+    '''
+    tr = view.camera.transform
+    return (tuple(cross.y_axis.pos), tuple(cross.y_axis_ref.pos), tuple(cross.x_axis.pos),
+            cross.y_axis_ref.visible, getattr(cross.y_axis, '_start_index', 0), cross.y_axis.npts, 
+            tuple(tr.scale), tuple(tr.translate), tuple(view.pos), tuple(view.size))
+
+
+def _camera_rect(camera):
+    rect = camera.rect
+    return tuple(rect.pos) + tuple(rect.size)
+
+
+def set_channel_range(camera, nCh, gap, last_key=None, force=False):
+    '''
+    fit the camera to nCh channels with vertical gap and return the new key (nCh, gap, rect)
+    nothing to do when (nCh, gap) is the same as last_key and the camera has not been panned or zoomed since
+    '''
+    if not force and last_key is not None and last_key == (nCh, gap, _camera_rect(camera)):
+        return last_key
+    bottom = -1 + 1./nCh - gap/nCh
+    top    = bottom + gap*2
+    camera.set_range(x=(-1,1), y=(bottom, top))
+    camera.set_default_state()
+    camera.reset()
+    return (nCh, gap, _camera_rect(camera))
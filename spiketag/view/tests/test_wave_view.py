@@ -0,0 +1,41 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.view.wave_view import _minmax_decimate, _gather_cols, wave_view
+
+class TestWaveView(unittest.TestCase):
+
+    def test_minmax_decimate(self):
+
+        rng = np.random.RandomState(0)
+        x = rng.randint(-2000, 2000, size=(1003, 5)).astype(np.int16)
+        for k in [1, 2, 7, 10, 1003, 2000]:
+            out = _minmax_decimate(x, k)
+            # plain loop, the last bin keeps the remaining points
+            expected = []
+            for i in range(0, x.shape[0], k):
+                expected.append(x[i:i+k].min(axis=0))
+                expected.append(x[i:i+k].max(axis=0))
+            np.testing.assert_array_equal(out, np.array(expected))
+            self.assertEqual(out.dtype, x.dtype)
+
+    def test_gather_cols(self):
+
+        rng = np.random.RandomState(1)
+        data = rng.randint(-2000, 2000, size=(500, 16)).astype(np.int16)
+        for cols in [[3], [0, 5, 2], [15, 14, 13, 12], [7, 7, 1]]:
+            cols = np.array(cols, dtype=np.int64)
+            out = _gather_cols(data, 100, 180, cols)
+            np.testing.assert_array_equal(out, data[100:180, cols])
+            self.assertEqual(out.dtype, data.dtype)
+
+    def test_cols_to_slice(self):
+
+        data = np.arange(40).reshape(5, 8)
+        for cols in [[3], [2, 3, 4], [4, 3, 2], [2, 1, 0], [0, 2, 4], [3, 1]]:
+            cols = np.array(cols, dtype=np.int64)
+            _slice = wave_view._cols_to_slice(cols)
+            if _slice is not None:
+                np.testing.assert_array_equal(data[:, _slice], data[:, cols])
+        self.assertIsNone(wave_view._cols_to_slice(np.array([0, 2, 4])))
@@ -0,0 +1,65 @@
+import sys
+sys.path.append('../../../')
+import unittest
+import numpy as np
+from spiketag.view.MyWaveVisual import MyWaveVisual
+
+class TestMyWaveVisual(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.data = rng.uniform(-10, 10, size=(400, 3)).astype(np.float32)
+        # the max and min of every page below, so the scale stays the same while rolling
+        self.data[150, 0], self.data[160, 1] = 1000, -1000
+        self.npts = 100
+
+    def _page(self, wave):
+        '''
+        (nCh, npts) in page order, unwrapped from the ring buffer
+        '''
+        y = wave.data.reshape(wave.nCh, wave.npts+1)
+        np.testing.assert_array_equal(y[:, -1], y[:, 0])    # the seam vertex repeats slot 0
+        return y[:, (wave._head + np.arange(wave.npts)) % wave.npts]
+
+    def _set_page(self, start):
+        wave = MyWaveVisual()
+        wave.set_data(self.data[start:start+self.npts])
+        return wave
+
+    def test_roll_matches_set_data(self):
+
+        wave = self._set_page(100)
+        start = 100
+        for offset in [30, 20, -50, -20, -19, 89]:
+            t0, t1 = (start+self.npts, start+self.npts+offset) if offset > 0 else (start+offset, start)
+            self.assertTrue(wave.roll(self.data[t0:t1], offset))
+            start += offset
+            np.testing.assert_array_equal(self._page(wave), self._page(self._set_page(start)))
+            self.assertEqual(wave._scale, self._set_page(start)._scale)
+
+            # the x position of every slot follows the page order
+            x = wave.get_gl_pos()[:, 0].reshape(wave.nCh, -1)
+            x_page = x[:, (wave._head + np.arange(wave.npts)) % wave.npts]
+            np.testing.assert_allclose(x_page, self._set_page(start).get_gl_pos()[:, 0].reshape(wave.nCh, -1)[:, :-1])
+
+    def test_roll_refuses_new_scale(self):
+
+        wave = self._set_page(100)
+        before = wave.data.copy()
+        strip = self.data[200:220].copy()
+        strip[5, 2] = 5000
+        self.assertFalse(wave.roll(strip, 20))
+        np.testing.assert_array_equal(wave.data, before)
+        self.assertEqual(wave._head, 0)
+
+    def test_roll_resets_colors_of_exposed_points(self):
+
+        wave = self._set_page(100)
+        wave.highlight_spikes(np.array([[20, 0], [95, 1]]))
+        wave.roll(self.data[200:210], 10)
+        color = wave.color.reshape(wave.nCh, wave.npts+1, 4)[:, (wave._head + np.arange(wave.npts)) % wave.npts]
+        # spike at 20 is now at 10, the points of the spike at 95 (now 85) after the old page end are reset
+        np.testing.assert_array_equal(color[0, 5:15], [(0,1,0,1)]*10)
+        np.testing.assert_array_equal(color[1, 80:90], [(0,1,0,1)]*10)
+        np.testing.assert_array_equal(color[1, 90:], 1)
+        np.testing.assert_array_equal(color[2], 1)
@@ -2,52 +2,12 @@ import numpy as np
 from vispy import scene, app
 from vispy.util import keys
 from .MyWaveVisual import MyWaveVisual
+from .axis import Axis, cursor_key, set_channel_range
 from .color_scheme import palette
 from ..view import Picker
 from ..utils import EventEmitter
 
 
-class Axis(scene.AxisWidget):
-    """from scene.AxisWidget"""
-    def set_x_transform(self, x_transform):
-        self.glpos_to_time = x_transform
-
-    def set_y_transform(self, y_transform):
-        self.glpos_to_value = y_transform
-
-    def glpos_to_time(self, gl_pos):
-        '''
-        get time from the x postion of x_axis
-        Important: check the affine transformation in MyWaveVisual!
-        '''
-        xn = np.ceil((gl_pos / 0.95 + 1) * (self.npts - 1) / 2)
-        t = (xn + self._time_slice * self._time_span) / self.fs
-        return t
-
-
-    def glpos_to_value(self, gl_pos):
-        '''
-        get value from the y postion of y_axis
-        Important: check the affine transformation in MyWaveVisual!
-        '''
-        y = (gl_pos+1-1./self.nCh) / 0.95 * self.nCh
-        y = y*self.yscale
-        return y
-    
-    def _view_changed(self, event=None):
-        """Linked view transform has changed; update ticks.
-        """
-        tr = self.node_transform(self._linked_view.scene)
-        p1, p2 = tr.map(self._axis_ends())
-        if self.orientation in ('left', 'right'):
-            # yaxis
-            self.axis.domain = (self.glpos_to_value(p1[1]), self.glpos_to_value(p2[1]))
-            # self.axis.domain = (p1[1],p2[1])
-        else:
-            # xaxis
-            self.axis.domain = (self.glpos_to_time(p1[0]), self.glpos_to_time(p2[0]))
-
-
 class Cross(object):
     def __init__(self, cursor_color):
 
@@ -172,6 +132,7 @@ class trace_view(scene.SceneCanvas):
                                       parent=self.view2.scene)
         self.cursor_rect.visible = False
         self.palette = palette
+        self._palette_rgba = np.hstack((np.asarray(palette), np.ones((len(palette), 1)))).astype(np.float32)
         self._gap_value = gap_value
         self._locate_buffer = 200
         self._picker = Picker(self.scene, self.view2.camera.transform)
@@ -183,7 +144,10 @@ class trace_view(scene.SceneCanvas):
 
         self.grid2 = self.view2.add_grid(spacing=0, bgcolor=(0, 0, 0, 0), border_color='k')
         self.cross = Cross(cursor_color=self.cursor_color)
-        self.timer_cursor = app.Timer(connect=self.update_cursor, interval=0.01, start=False)
+        self.timer_cursor = app.Timer(connect=self.update_cursor, interval=0.033, start=False)
+        self._last_cursor_key = None
+        self._last_range_key = None
+        self._last_move_pos = None
         self.event = EventEmitter()
 
     def _render(self, data):
@@ -252,13 +216,14 @@ class trace_view(scene.SceneCanvas):
 
         # highlight all spikes within this segment
         self.all_pos = self.get_near_pos(global_idx[0], (locate_start, locate_end))
-        for (p,i) in self.all_pos:
-            highlight_start = p
-            highlight_end = highlight_start + self.spklen
-            highlight_segment = [[highlight_start,highlight_end]]
-            _cluNo = list(self.clu.global2local(i).keys())[0]
-            highlight_color = np.hstack((self.palette[_cluNo],1))
-            self.waves1.highlight(np.arange(self.nCh),highlight_segment, highlight_color)
+        if len(self.all_pos) == 0:
+            return
+        # one highlight (one color upload) per cluster rather than per spike
+        clu_ids = self.clu.membership[self.all_pos[:, 1]]
+        highlight_segments = np.column_stack((self.all_pos[:, 0], self.all_pos[:, 0] + self.spklen))
+        highlight_chs = np.arange(self.nCh)
+        for _cluNo in np.unique(clu_ids):
+            self.waves1.highlight(highlight_chs, highlight_segments[clu_ids == _cluNo], self._palette_rgba[_cluNo])
 
     @property
     def locate_buffer(self):
@@ -277,12 +242,12 @@ class trace_view(scene.SceneCanvas):
         '''
             get all spikes with data_range, the pos is local pos
         '''
-        point_range = np.arange(data_range[0],data_range[1] + 1)
         idx_buffer = 10
         idx_start = global_idx - idx_buffer if (global_idx - idx_buffer) > 0 else 0
         idx_end = global_idx + idx_buffer
-        selected_spikes_pos = np.intersect1d(point_range,self.times[idx_start:idx_end]) 
-        selected_spikes_idx = np.where(np.in1d(self.times,selected_spikes_pos))[0]
+        near_times = self.times[idx_start:idx_end]
+        selected_spikes_idx = np.flatnonzero((near_times >= data_range[0]) & (near_times <= data_range[1])) + idx_start
+        selected_spikes_pos = self.times[selected_spikes_idx]
         return np.column_stack((selected_spikes_pos - data_range[0] - 8, selected_spikes_idx))
 
     @property
@@ -304,20 +269,20 @@ class trace_view(scene.SceneCanvas):
         else:
             self.cross.disable_tick(axis=1)
 
-    def set_range(self):
-        gap = self.gap_value
-        N = self.nCh
-        bottom = -1 + 1./N - gap/N
-        top    = bottom + gap*2
-        self.view2.camera.set_range(x=(-1,1), y=(bottom, top))
-        self.view2.camera.set_default_state()
-        self.view2.camera.reset()
+    def set_range(self, force=False):
+        self._last_range_key = set_channel_range(self.view2.camera, self.nCh, self.gap_value,
+                                                 self._last_range_key, force=force)
 
     def attach(self, gui):
         self.unfreeze()
         gui.add_view(self)
 
     def update_cursor(self, ev):
+        key = cursor_key(self.view2, self.cross)
+        if key == self._last_cursor_key:
+            return
+        self._last_cursor_key = key
+
         pos = (self.cross.y_axis.pos[0], 0)
         gl_pos = self.view2.camera.transform.imap(pos)[0]
         t = self.cross.y_axis.glpos_to_time(gl_pos)
@@ -380,7 +345,9 @@ class trace_view(scene.SceneCanvas):
                 self._picker.cast_net(e.pos,ptype='rectangle')
 
         elif self.cross.cross_state:
-            if e.press_event is None:
+            # hover events can repeat the same pixel, only move the cross when it changes
+            if e.press_event is None and tuple(e.pos) != self._last_move_pos:
+                self._last_move_pos = tuple(e.pos)
                 self.cross.moveto(e.pos)
                 self.cross.ref_disable()
 
@@ -1,50 +1,59 @@
 import numpy as np
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from vispy import scene, app
 from .MyWaveVisual import MyWaveVisual
+from .axis import Axis, cursor_key, set_channel_range
 from .color_scheme import palette
 from ..view import Picker, YSyncCamera
 from vispy.util import keys
+from numba import njit, prange
 
 
-class Axis(scene.AxisWidget):
-    """from scene.AxisWidget"""
-    def set_x_transform(self, x_transform):
-        self.glpos_to_time = x_transform
-
-    def set_y_transform(self, y_transform):
-        self.glpos_to_value = y_transform
-
-    def glpos_to_time(self, gl_pos):
-        '''
-        get time from the x postion of x_axis
-        Important: check the affine transformation in MyWaveVisual!
-        '''
-        xn = np.ceil((gl_pos / 0.95 + 1) * (self.npts - 1) / 2)
-        t = (xn + self._start_index + self._time_slice * self._time_span) / self.fs
-        return t
+@njit(parallel=True, cache=True, nogil=True)
+def _gather_cols(data, start, end, cols):
+    '''
+    data[start:end, cols] for an arbitrary list of columns, rows are gathered in parallel
+    '''
+    out = np.empty((end-start, cols.shape[0]), data.dtype)
+    for i in prange(end-start):
+        for j in range(cols.shape[0]):
+            out[i, j] = data[start+i, cols[j]]
+    return out
 
 
-    def glpos_to_value(self, gl_pos):
-        '''
-        get value from the y postion of y_axis
-        Important: check the affine transformation in MyWaveVisual!
-        '''
-        y = (gl_pos+1-1./self.nCh) / 0.95 * self.nCh
-        y = y*self.yscale
-        return y
-    
-    def _view_changed(self, event=None):
-        """Linked view transform has changed; update ticks.
-        """
-        tr = self.node_transform(self._linked_view.scene)
-        p1, p2 = tr.map(self._axis_ends())
-        if self.orientation in ('left', 'right'):
-            # yaxis
-            self.axis.domain = (self.glpos_to_value(p1[1]), self.glpos_to_value(p2[1]))
-            # self.axis.domain = (p1[1],p2[1])
-        else:
-            # xaxis
-            self.axis.domain = (self.glpos_to_time(p1[0]), self.glpos_to_time(p2[0]))
+@njit(parallel=True, cache=True, fastmath=True, nogil=True)
+def _minmax_decimate(x, k):
+    '''
+    min and max of every k points of x (n, nCh), interleaved into (2*ceil(n/k), nCh)
+    the last bin has the n % k remaining points when k does not divide n
+    '''
+    n = x.shape[0]
+    nbins = (n + k - 1) // k
+    nch = x.shape[1]
+    out = np.empty((2*nbins, nch), x.dtype)
+    for i in prange(nbins):
+        for c in range(nch):
+            out[2*i, c] = x[i*k, c]
+            out[2*i+1, c] = x[i*k, c]
+        for j in range(i*k+1, min((i+1)*k, n)):
+            for c in range(nch):
+                v = x[j, c]
+                if v < out[2*i, c]:
+                    out[2*i, c] = v
+                if v > out[2*i+1, c]:
+                    out[2*i+1, c] = v
+    return out
+
+
+@lru_cache(maxsize=64)
+def _y_template(N, gap):
+    '''
+    y positions of the labels of N channels with vertical gap
+    '''
+    y = -1 + 2 * (np.arange(N) * gap + 0.5) / N
+    y.flags.writeable = False
+    return y
 
 
 class Cross(object):
@@ -163,6 +172,8 @@ class wave_view(scene.SceneCanvas):
             the pivotal postion of spikes, support two formats. Look examples for more details.
         chs: array-like
             the specific channels which want to show, it chs is none, show the first 32 channels (0-31). 
+        decimate: bool
+            draw wide pages as the min/max of every few points (about 2 points per pixel), off by default
 
         Examples
         ----------
@@ -192,7 +203,7 @@ class wave_view(scene.SceneCanvas):
             wview.show()
     '''
 
-    def __init__(self, data=None, fs=25e3, spks=None, chs=None, color=None, pagesize=20000, ncols=1, gap_value=0.8*0.95, ls='-', time_slice=0):
+    def __init__(self, data=None, fs=25e3, spks=None, chs=None, color=None, pagesize=20000, ncols=1, gap_value=0.8*0.95, ls='-', time_slice=0, decimate=False):
         scene.SceneCanvas.__init__(self, keys=None)
         self.unfreeze()
 
@@ -221,7 +232,17 @@ class wave_view(scene.SceneCanvas):
 
         self.grid2 = self.view2.add_grid(spacing=0, bgcolor=(0, 0, 0, 0), border_color='k')
         self.cross = Cross(cursor_color=self.cursor_color)
-        self.timer_cursor = app.Timer(connect=self.update_cursor, interval=0.01, start=False)
+        self.timer_cursor = app.Timer(connect=self.update_cursor, interval=0.033, start=False)
+        self._last_cursor_key = None
+        self._last_range_key = None
+        self._last_move_pos = None
+        self._pending_slide = 0
+        self._pending_to = None
+        # pages read in the background, (decimation, npts, start, future) of the last requested one
+        self._gather_pool = ThreadPoolExecutor(max_workers=1)
+        self._pending_page = None
+        self._upload_timer = app.Timer(interval=0.005, connect=self._upload_page, start=False)
+        self._slide_timer = app.Timer(interval=1./60, connect=self._apply_slide, iterations=1, start=False)
 
         self.view1 = self.grid1.add_view(row=0, col=0, col_span=1, margin=10, bgcolor=(0, 0, 0, 1),
                           border_color=(1, 0, 0))
@@ -231,6 +252,7 @@ class wave_view(scene.SceneCanvas):
         self._start_index = 0
         self.flag = 0
         self._pagesize = pagesize
+        self._decimate_on = decimate
         self.location = ''
         y_sync_cam = YSyncCamera()
         self.view1.camera.link(y_sync_cam)
@@ -239,12 +261,12 @@ class wave_view(scene.SceneCanvas):
         self.ch_no_text = scene.Text('', pos=(0,0),italic=False, bold=True,
                          color=self.cursor_color, font_size=12, parent=self.view1.scene) 
         
+        # keep data as given (e.g. an int16 memmap), the shown channels are gathered page by page
         self.data = data
         if chs is not None:
             chs = np.array(chs)
             if chs.ndim!=1:
                 chs = chs.ravel()
-            self.data = self.data[:, chs]
             chs_labels = chs
         elif self.data.shape[1] <= 32:
             chs_labels = np.arange(self.data.shape[1])
@@ -252,8 +274,13 @@ class wave_view(scene.SceneCanvas):
             chs_labels = np.arange(32)
         self._chs = list(zip(chs_labels, np.arange(len(chs_labels))))
         self._chs_idx = sorted([j for _, j in self._chs], reverse=True)
-        self.spikes = self._spkarray2dist(spks) 
-        self._render(self.data[0:self.pagesize, self._chs_idx])
+        self._page_cols = np.asarray(chs_labels, dtype=np.int64)[self._chs_idx]
+        self._page_slice = self._cols_to_slice(self._page_cols)
+        self._ch_texts = [str(i) for i, _ in reversed(self._chs)]
+        self._spk_scratch = np.empty((4096, 2), dtype=np.int64)
+        self._flatten_spikes(spks)
+        self._decimate = self._decimation()
+        self._render(self._read_page(0, self.pagesize, self._decimate), self._page_len(0))
         self.attach_texts()
         self.highlight_ch()
         self.set_range()
@@ -268,7 +295,7 @@ class wave_view(scene.SceneCanvas):
         self._picker = Picker(self.scene, self.view2.camera.transform)
         self.picked_data = []
     
-    def _render(self, data):
+    def _render(self, data, npts=None):
         '''
           For now,wave_visual is the best place  where store the view information,
           and wave_view should get from it, otherwise,there are two copy of information,
@@ -277,7 +304,8 @@ class wave_view(scene.SceneCanvas):
         self.waves1.set_data(data)
 
         ####### get basic info from wave visual
-        self.npts = self.waves1.npts
+        # npts is the number of samples of the page, the visual has fewer points when it is decimated
+        self.npts = self.waves1.npts if npts is None else npts
         self.nCh = self.waves1.nCh
         scale = self.waves1._scale
 
@@ -287,22 +315,70 @@ class wave_view(scene.SceneCanvas):
         ####### trigger timer ######
         self.timer_cursor.start()
 
-    def _spkarray2dist(self, spks):
-        if spks is None:
-            return None
+    def _decimation(self):
+        '''
+        number of points per min/max pair so that a page has about 2 points per pixel, 1 (no decimation) 
+        unless decimate=True
+        '''
+        if not self._decimate_on:
+            return 1
+        return max(self.pagesize // (2 * max(int(self.size[0]), 1)), 1)
+
+    def _page_len(self, start):
+        '''
+        number of samples of the page from start
+        '''
+        return max(min(self.pagesize, self.data.shape[0] - int(start)), 0)
+
+    @staticmethod
+    def _cols_to_slice(cols):
+        '''
+        the basic slice equal to cols when they are consecutive (either direction), otherwise None
+        '''
+        if len(cols) == 1:
+            return slice(cols[0], cols[0]+1)
+        step = cols[1] - cols[0]
+        if step in (1, -1) and np.all(np.diff(cols) == step):
+            stop = cols[-1] + step
+            return slice(cols[0], stop if stop >= 0 else None, step)
+        return None
+
+    def _gather(self, start, end):
+        '''
+        data[start:end, self._page_cols], a view when the shown channels are consecutive
+        '''
+        if self._page_slice is not None:
+            return self.data[start:end, self._page_slice]
+        end = min(end, self.data.shape[0])
+        return _gather_cols(self.data, start, end, self._page_cols)
 
-        dist = {}
-        chs = dict(self._chs)
+    def _read_page(self, start, end, k):
+        '''
+        the samples of a page, decimated into min/max pairs of every k points when k > 1
+        only reads self.data, so it can run on the gather thread
+        '''
+        data = self._gather(start, end)
+        if k > 1:
+            return _minmax_decimate(data, k)
+        return np.ascontiguousarray(data)
 
+    @staticmethod
+    def _spk_format2(spks):
         # if format 1, convert to format 2
         if len(spks.shape) == 1:
             spks = spks.reshape(-1, 2).T
+        return spks
 
-        for i in np.unique(spks[1]):
-            if i in chs.keys():
-                dist[chs[i]] = spks[0][spks[1] == i]
-
-        return dist
+    def _spk_cols(self, spk_chs):
+        '''
+        channel label -> data column of every spike, -1 for channels not shown
+        '''
+        labels = np.array([i for i, _ in self._chs], dtype=np.int64)
+        cols = np.array([j for _, j in self._chs], dtype=np.int64)
+        spk_chs = np.asarray(spk_chs, dtype=np.int64)
+        lut = np.full(max(labels.max(), spk_chs.max(initial=0)) + 1, -1, dtype=np.int64)
+        lut[labels] = cols
+        return lut[spk_chs]
 
 
     def convert_2_highlight_ch(self, chs):
@@ -311,22 +387,54 @@ class wave_view(scene.SceneCanvas):
 
     def highlight(self, chs, timelist, colorlist=None, mask_others=False):
         highlight_chs = self.convert_2_highlight_ch(chs)
+        if self._decimate > 1:
+            timelist = np.asarray(timelist) // self._decimate * 2
         self.waves1.highlight_ch(highlight_chs, highlight_color=(1,1,1,1), mask_others=mask_others)
         self.waves1.highlight(highlight_chs, timelist, colorlist) 
 
-    def highlight_ch(self):
-        
-        if getattr(self, 'spikes', None) is None or self.spikes is None:
+    def _flatten_spikes(self, spks):
+        '''
+        (t, row) arrays of the spikes on shown channels sorted by t, so that the spikes of
+        a page can be sliced out with one searchsorted instead of a scan per channel
+        '''
+        self._spk_t, self._spk_row = None, None
+        if spks is None:
             return
 
-        for idx, val in enumerate(self._chs_idx):
-            t = self.spikes.get(val, None)
-            if t is not None:
-                times = np.take(t, np.where((t >= self._start_index) & (t < self._start_index + self.pagesize)))[0] - self._start_index
-                #  times = np.intersect1d(np.arange(self._start_index,self._start_index + self.pagesize),self.spks[0][self.spks[1] == val]) -  self._start_index
-                if times.size > 0:
-                    spks = np.column_stack((times, np.full(times.shape,idx, dtype=np.int64)))
-                    self.waves1.highlight_spikes(spks)
+        spks = self._spk_format2(spks)
+        cols = self._spk_cols(spks[1])
+        keep = cols >= 0
+        row_of = np.empty(len(self._chs_idx), dtype=np.int64)
+        row_of[self._chs_idx] = np.arange(len(self._chs_idx))
+        t, row = np.asarray(spks[0], dtype=np.int64)[keep], row_of[cols[keep]]
+        # pivotal positions normally come sorted by time, only sort when they are not
+        if np.any(t[1:] < t[:-1]):
+            order = np.argsort(t, kind='mergesort')
+            t, row = t[order], row[order]
+        self._spk_t, self._spk_row = t, row
+
+    def highlight_ch(self, t0=None, t1=None):
+        '''
+        highlight the spikes of the page, only those with the peak in [t0, t1) when given
+        '''
+        if getattr(self, '_spk_t', None) is None:
+            return
+
+        t0 = self._start_index if t0 is None else max(t0, self._start_index)
+        t1 = self._start_index + self.pagesize if t1 is None else min(t1, self._start_index + self.pagesize)
+        lo, hi = np.searchsorted(self._spk_t, [t0, t1])
+        n = hi - lo
+        if n > 0:
+            # fill a reused (t, row) buffer instead of allocating a new stack every page
+            if n > self._spk_scratch.shape[0]:
+                self._spk_scratch = np.empty((1 << int(n-1).bit_length(), 2), dtype=np.int64)
+            spks = self._spk_scratch[:n]
+            np.subtract(self._spk_t[lo:hi], self._start_index, out=spks[:, 0], casting='unsafe')
+            spks[:, 1] = self._spk_row[lo:hi]
+            if self._decimate > 1:
+                spks[:, 0] //= self._decimate
+                spks[:, 0] *= 2
+            self.waves1.highlight_spikes(spks)
 
     @property
     def gap_value(self):
@@ -348,39 +456,117 @@ class wave_view(scene.SceneCanvas):
         else:
             self.cross.disable_tick(axis=1)
 
-    def set_range(self):
-        gap = self.gap_value
-        N = self.nCh
-        bottom = -1 + 1./N - gap/N
-        top    = bottom + gap*2
-        self.view2.camera.set_range(x=(-1,1), y=(bottom, top))
-        self.view2.camera.set_default_state()
-        self.view2.camera.reset()
+    def set_range(self, force=False):
+        self._last_range_key = set_channel_range(self.view2.camera, self.nCh, self.gap_value,
+                                                 self._last_range_key, force=force)
 
 
     def attach(self, gui):
         self.unfreeze()
         gui.add_view(self)
 
-    def slideto(self, to):
+    def _page_to(self, start, wait=True):
+        '''
+        move the page to start, when the new page overlaps the current one only
+        the newly exposed samples are pushed into the ring buffer of waves1
+        otherwise the page is read right away (wait=True) or on the gather thread
+        self._start_index is the start of the page on screen, it only changes when the page is rendered
+        '''
+        offset = int(start) - int(self._start_index)
+        start, end = int(start), int(start) + self.pagesize
+        npts = self.waves1.npts
+        k = self._decimation()
+        if (self._pending_page is None and self._decimate == 1 and k == 1 and npts == self.pagesize
+                and end <= self.data.shape[0] and 0 < abs(offset) < npts):
+            t0, t1 = (end-offset, end) if offset > 0 else (start, start-offset)
+            all_reset = self.waves1._color_dirty
+            if self.waves1.roll(self._gather(t0, t1), offset):
+                self._start_index = start
+                # only the exposed points lost their colors (unless all of them did), so only the spikes 
+                # with a highlighted point in [t0, t1) are highlighted again
+                if all_reset:
+                    self._page_changed()
+                else:
+                    self.highlight_ch(t0 - self.waves1.post_peak, t1 + self.waves1.pre_peak)
+                    self.cross.start_index_changed(self._start_index)
+                    self.cross.view_changed()
+                return
+        if wait:
+            self._cancel_page()
+            self._decimate = k
+            self._render(self._read_page(start, end, k), self._page_len(start))
+            self._start_index = start
+            self._page_changed()
+        else:
+            self._cancel_page()
+            self._pending_page = (k, self._page_len(start), start,
+                                  self._gather_pool.submit(self._read_page, start, end, k))
+            self._upload_timer.start()
+
+    def _cancel_page(self):
+        if self._pending_page is not None:
+            self._pending_page[-1].cancel()
+            self._pending_page = None
+            self._upload_timer.stop()
+
+    def _upload_page(self, ev=None):
+        '''
+        GL upload of the page read on the gather thread, polled on the GUI thread
+        '''
+        if self._pending_page is None:
+            self._upload_timer.stop()
+            return
+        k, npts, start, future = self._pending_page
+        if not future.done():
+            return
+        self._upload_timer.stop()
+        self._pending_page = None
+        self._decimate = k
+        self._render(future.result(), npts)
+        self._start_index = start
+        self._page_changed()
+
+    def _page_changed(self):
+        self.highlight_ch()
+        self.cross.start_index_changed(self._start_index)
+        self.cross.view_changed()
+
+    def slideto(self, to, wait=True):
         if to < self.data.shape[0]:
-            self._start_index = int(to) - self.pagesize / 2
-            if self._start_index < 0:
-                self._start_index = 0
-            self._render(self.data[int(self._start_index):int(self._start_index + self.pagesize), self._chs_idx])
-            self.highlight_ch()
-            self.cross.start_index_changed(self._start_index)
-            self.cross.view_changed()
+            start = int(to) - self.pagesize / 2
+            if start < 0:
+                start = 0
+            self._page_to(start, wait)
 
     def slide(self, offset):
-        tmp = self._start_index + int(offset) * 10
+        '''
+        slides requested within one frame (e.g. a burst of mouse moves) are summed and rendered once
+        '''
+        self._pending_slide += int(offset)
+        if not self._slide_timer.running:
+            self._slide_timer.start()
+
+    def _slideto_later(self, to):
+        '''
+        like slideto, but only the last target requested within one frame is rendered
+        '''
+        self._pending_to = to
+        if not self._slide_timer.running:
+            self._slide_timer.start()
+
+    def _apply_slide(self, ev=None):
+        self._slide_timer.stop()
+        if self._pending_to is not None:
+            to, self._pending_to = self._pending_to, None
+            self.slideto(to, wait=False)
+        offset, self._pending_slide = self._pending_slide, 0
+        if offset == 0:
+            return
+        # slide from the page that is being read, if any, so that no slide is lost
+        tmp = (self._start_index if self._pending_page is None else self._pending_page[2]) + offset * 10
 
         if tmp  >= 0 and tmp + self.pagesize < self.data.shape[0]:
-            self._start_index = tmp
-            self._render(self.data[int(self._start_index):int(self._start_index + self.pagesize), self._chs_idx])
-            self.highlight_ch()
-            self.cross.start_index_changed(self._start_index)
-            self.cross.view_changed()
+            self._page_to(tmp, wait=False)
         elif tmp < 0:
             self._start_index = 0
     
@@ -412,15 +598,20 @@ class wave_view(scene.SceneCanvas):
 
     def attach_texts(self):
         
-        y = -1 + 2 * (np.arange(len(list(self._chs))) * self.gap_value + 0.5) / len(list(self._chs))
-        poses = np.column_stack((np.zeros(len(list(self._chs))),y))
-        texts = [ str(i) for i,_ in reversed(self._chs)] 
+        N = len(self._chs)
+        poses = np.zeros((N, 2))
+        poses[:, 1] = _y_template(N, self.gap_value)
         
-        self.ch_no_text.text = texts
+        self.ch_no_text.text = self._ch_texts
         self.ch_no_text.pos = poses
 
 
     def update_cursor(self, ev):
+        key = cursor_key(self.view2, self.cross)
+        if key == self._last_cursor_key:
+            return
+        self._last_cursor_key = key
+
         pos = (self.cross.y_axis.pos[0], 0)
         gl_pos = self.view2.camera.transform.imap(pos)[0]
         t = self.cross.y_axis.glpos_to_time(gl_pos)
@@ -485,10 +676,10 @@ class wave_view(scene.SceneCanvas):
             self.location = ''
         elif event.text == 'h' or getattr(event.key, 'name', None) == 'Left':
             self._current_time = self._current_time - self._sliding_time
-            self.slideto(self._current_time * self.fs)
+            self._slideto_later(self._current_time * self.fs)
         elif event.text == 'l' or getattr(event.key, 'name', None) == 'Right':
             self._current_time = self._current_time + self._sliding_time
-            self.slideto(self._current_time * self.fs)
+            self._slideto_later(self._current_time * self.fs)
         elif event.text == '=':
             location = self._start_index + self.pagesize / 2
             self.pagesize += int(self.pagesize * 0.1)
@@ -501,6 +692,15 @@ class wave_view(scene.SceneCanvas):
             self.key_option = event.key.name
             # print event.text
      
+    def on_close(self, event):
+        '''
+        stop the pending page and the gather thread with the canvas
+        '''
+        self._slide_timer.stop()
+        self._upload_timer.stop()
+        self._cancel_page()
+        self._gather_pool.shutdown(wait=False)
+
     def on_key_release(self, e):
         if self.key_option == "Escape":
             self._picker.reset()
@@ -538,7 +738,9 @@ class wave_view(scene.SceneCanvas):
 
 
         elif self.cross.cross_state:
-            if event.press_event is None:
+            # hover events can repeat the same pixel, only move the cross when it changes
+            if event.press_event is None and tuple(event.pos) != self._last_move_pos:
+                self._last_move_pos = tuple(event.pos)
                 self.cross.moveto(event.pos)
                 self.cross.ref_disable()
 